@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Uçtan uca yük testi.
+
+Sahte koordinatörler, coordinator.c formatındaki satırları her biri ayrı bir
+pseudo-terminal (pty) üzerinden yazar; v8.py'deki SensorDataSender bu pty'yi seri port gibi okur;
+v7.py Flask sunucusu ayrı bir süreçte yerel sunucu olarak çalışır.
+
+Her satırın TX_drift alanı sıra numarası taşır. Sunucu veritabanı sık aralıklarla
+okunarak her kaydın ilk görüldüğü an bulunur; buradan gecikme, kayıp ve tekrar hesaplanır.
+
+Örnek:
+    python3 bench_pipeline.py --nodes 50 --rate 200 --duration 60
+    python3 bench_pipeline.py --scenario outage --outage-length 20
+    python3 bench_pipeline.py --coordinators 3 --rate 300
+    python3 bench_pipeline.py --binary --rate 500
+"""
+
+import argparse
+import binascii
+import json
+import logging
+import os
+import pty
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GATEWAY_DIR = os.path.join(BASE_DIR, 'raspberri_pi_zero_codes')
+SERVER_DIR = os.path.join(BASE_DIR, 'server_kodu')
+
+# Sunucu alt süreci: ilk başlatmada veritabanları oluşturulur, kesinti sonrası
+# yeniden başlatmada mevcut veriler korunur
+SERVER_SNIPPET = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import v7
+from werkzeug.serving import make_server
+if sys.argv[3] == 'init':
+    v7.init_database()
+    v7.init_error_database()
+make_server('127.0.0.1', int(sys.argv[2]), v7.app, threaded=True).serve_forever()
+'''
+
+def free_port():
+    """Boş bir TCP portu bul"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def process_cpu_seconds(pid):
+    """Bir sürecin toplam CPU süresi (/proc üzerinden, saniye)"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+def percentile(sorted_values, fraction):
+    """Sıralı listeden yüzdelik değer"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class LocalServer:
+    """v7.py'yi ayrı süreçte çalıştırır, kesinti senaryosu için durdurulup başlatılabilir"""
+
+    def __init__(self, workdir, port):
+        self.workdir = workdir
+        self.port = port
+        self.process = None
+        self.cpu_seconds = 0.0
+        self.initialized = False
+
+    def start(self):
+        mode = 'keep' if self.initialized else 'init'
+        self.process = subprocess.Popen(
+            [sys.executable, '-c', SERVER_SNIPPET, SERVER_DIR, str(self.port), mode],
+            cwd=self.workdir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.initialized = True
+        # Port dinlemeye başlayana kadar bekle
+        deadline = time.time() + 15
+        while time.time() < deadline:
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError('Sunucu başlatılamadı')
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.cpu_seconds += process_cpu_seconds(self.process.pid)
+        self.process.terminate()
+        self.process.wait()
+        self.process = None
+
+    def total_cpu_seconds(self):
+        running = process_cpu_seconds(self.process.pid) if self.process else 0.0
+        return self.cpu_seconds + running
+
+def encode_frame(values):
+    """coordinator.c'nin ikili modundaki okuma çerçevesi: tip + alanlar + CRC16, COBS, 0x00 ayraçları"""
+    raw = bytes([0x01]) + struct.pack('<HHhHHhh', *values)
+    raw += binascii.crc_hqx(raw, 0xFFFF).to_bytes(2, 'little')
+    encoded = bytearray([0])
+    code_pos = 0
+    for byte in raw:
+        if byte == 0:
+            encoded[code_pos] = len(encoded) - code_pos
+            code_pos = len(encoded)
+            encoded.append(0)
+        else:
+            encoded.append(byte)
+    encoded[code_pos] = len(encoded) - code_pos
+    return b'\0' + bytes(encoded) + b'\0'
+
+class FakeCoordinator(threading.Thread):
+    """
+    coordinator.c çıktısını belirli düğüm sayısı ve hızda pty'ye yazar.
+    Birden çok koordinatörde sıra numaraları çakışmaz: index, index + count, ...
+    binary ise COORDINATOR_BINARY_SERIAL ile derlenmiş gibi ikili çerçeve yazar.
+    """
+
+    def __init__(self, master_fd, nodes, rate, duration, index=0, count=1, binary=False):
+        super().__init__(name=f'fake-coordinator-{index}', daemon=True)
+        self.master_fd = master_fd
+        self.nodes = nodes
+        self.rate = rate
+        self.duration = duration
+        self.index = index
+        self.count = count
+        self.binary = binary
+        self.sent_at = {}  # sıra numarası -> gönderim zamanı
+        self.max_lag = 0.0  # Planlanan zamanın en fazla ne kadar gerisinde kalındı
+
+    def run(self):
+        interval = 1.0 / self.rate
+        total = int(self.rate * self.duration)
+        next_time = time.time()
+        for step in range(total):
+            seq = self.index + step * self.count
+            now = time.time()
+            if next_time > now:
+                time.sleep(next_time - now)
+            else:
+                self.max_lag = max(self.max_lag, now - next_time)
+
+            node_id = 1000 + seq % self.nodes
+            light = 1000 + seq % 500
+            temperature = 2000 + seq % 300
+            humidity_air = 5000 + seq % 700
+            if self.binary:
+                data = encode_frame((node_id, light, temperature, humidity_air, seq % 101, seq % 7, seq))
+            else:
+                data = (f"Node {node_id}: Light={light // 100}.{light % 100:02d}, "
+                        f"Temp={temperature // 100}.{temperature % 100:02d}, "
+                        f"Humid_air={humidity_air // 100}.{humidity_air % 100:02d}, "
+                        f"Humid_ground={seq % 101}%, RX_drift={seq % 7}, TX_drift={seq}\n").encode()
+            self.sent_at[seq] = time.time()
+            os.write(self.master_fd, data)
+            next_time += interval
+
+class ArrivalPoller(threading.Thread):
+    """Sunucu veritabanını okuyarak her kaydın ilk görüldüğü zamanı kaydeder"""
+
+    def __init__(self, db_path, poll_interval):
+        super().__init__(name='arrival-poller', daemon=True)
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.arrived_at = {}  # sıra numarası -> ilk görülme zamanı
+        self.duplicates = 0
+        self.per_coordinator = {}  # koordinatör (seri port) -> alınan kayıt
+        self.stop_event = threading.Event()
+
+    def run(self):
+        last_id = 0
+        conn = None
+        while not self.stop_event.is_set():
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.db_path, timeout=1)
+                rows = conn.execute(
+                    'SELECT id, tx_drift, coordinator FROM sensor_data WHERE id > ? ORDER BY id', (last_id,)
+                ).fetchall()
+            except sqlite3.Error:
+                rows = []
+            now = time.time()
+            for row_id, seq, coordinator in rows:
+                if seq in self.arrived_at:
+                    self.duplicates += 1
+                else:
+                    self.arrived_at[seq] = now
+                    self.per_coordinator[coordinator] = self.per_coordinator.get(coordinator, 0) + 1
+                last_id = row_id
+            self.stop_event.wait(self.poll_interval)
+        if conn is not None:
+            conn.close()
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    os.chdir(workdir)  # v8 ve v7 veritabanları göreli yollarla burada oluşur
+
+    port = free_port()
+    server = LocalServer(workdir, port)
+    server.start()
+
+    sys.path.insert(0, GATEWAY_DIR)
+    import v8
+
+    base = f'http://127.0.0.1:{port}'
+    for name in dir(v8):
+        if name.endswith('_URL'):
+            value = getattr(v8, name)
+            setattr(v8, name, base + value[value.index('/', len('http://')):])
+    ptys = [pty.openpty() for _ in range(args.coordinators)]
+    v8.SERIAL_PORTS = [os.ttyname(slave_fd) for _, slave_fd in ptys]
+    v8.METRICS_SNAPSHOT_PATH = ''
+    v8.BREAKER_BACKOFF_BASE = args.backoff_base
+
+    # Ağ geçidi günlükleri ölçümü etkilemesin
+    logging.getLogger('gateway').setLevel(logging.CRITICAL)
+
+    sender = v8.SensorDataSender()
+    threading.Thread(target=sender.run, name='gateway', daemon=True).start()
+    time.sleep(1)  # Gateway seri portu açsın
+
+    poller = ArrivalPoller(os.path.join(workdir, 'sensor_data.db'), args.poll_interval)
+    poller.start()
+    coordinators = [
+        FakeCoordinator(master_fd, args.nodes, args.rate / args.coordinators, args.duration,
+                        index, args.coordinators, args.binary)
+        for index, (master_fd, _) in enumerate(ptys)
+    ]
+
+    cpu_start = time.process_time()
+    server_cpu_start = server.total_cpu_seconds()
+    wall_start = time.time()
+    for coordinator in coordinators:
+        coordinator.start()
+
+    outage = None
+    if args.scenario == 'outage':
+        outage_start = args.duration * args.outage_at
+        time.sleep(outage_start)
+        server.stop()
+        outage = {'start': time.time() - wall_start, 'length': args.outage_length}
+        time.sleep(args.outage_length)
+        server.start()
+
+    sent_at = {}
+    for coordinator in coordinators:
+        coordinator.join()
+        sent_at.update(coordinator.sent_at)
+    send_end = time.time()
+
+    # Tüm kayıtlar gelene veya süre dolana kadar bekle
+    deadline = send_end + args.drain_timeout
+    while time.time() < deadline and len(poller.arrived_at) < len(sent_at):
+        time.sleep(0.1)
+    poller.stop_event.set()
+    poller.join()
+
+    wall = time.time() - wall_start
+    gateway_cpu = time.process_time() - cpu_start
+    server_cpu = server.total_cpu_seconds() - server_cpu_start
+    gateway_metrics = sender.metrics.snapshot(sender.metrics_gauges())
+    server.stop()
+
+    sent = len(sent_at)
+    received = len(poller.arrived_at)
+    latencies = sorted(
+        poller.arrived_at[seq] - sent_at[seq]
+        for seq in poller.arrived_at if seq in sent_at
+    )
+    last_arrival = max(poller.arrived_at.values()) if poller.arrived_at else wall_start
+
+    return {
+        'scenario': args.scenario,
+        'nodes': args.nodes,
+        'coordinators': args.coordinators,
+        'serial_format': 'binary' if args.binary else 'text',
+        'target_rate': args.rate,
+        'duration': args.duration,
+        'outage': outage,
+        'sent': sent,
+        'received': received,
+        'lost': sent - received,
+        'loss_ratio': (sent - received) / sent if sent else 0,
+        'duplicates': poller.duplicates,
+        'received_per_coordinator': poller.per_coordinator,
+        'throughput': received / (last_arrival - wall_start) if received else 0,
+        'generator_max_lag': max(coordinator.max_lag for coordinator in coordinators),
+        'latency': {
+            'p50': percentile(latencies, 0.50),
+            'p90': percentile(latencies, 0.90),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else None
+        },
+        'cpu': {
+            # Ağ geçidi ölçümü sahte koordinatör ve okuyucu thread'lerini de içerir
+            'gateway_process_percent': 100 * gateway_cpu / wall,
+            'server_process_percent': 100 * server_cpu / wall
+        },
+        'gateway_counters': gateway_metrics['counters'],
+        'workdir': workdir
+    }
+
+def print_report(result):
+    latency = result['latency']
+    def ms(value):
+        return f"{value * 1000:.1f} ms" if value is not None else '-'
+
+    print(f"Senaryo: {result['scenario']} - {result['coordinators']} koordinatör ({result['serial_format']}), "
+          f"{result['nodes']} düğüm, "
+          f"{result['target_rate']} satır/sn, {result['duration']} sn")
+    if result['outage']:
+        print(f"Kesinti: {result['outage']['start']:.1f}. saniyede {result['outage']['length']} sn")
+    print(f"Gönderilen: {result['sent']}, alınan: {result['received']}, "
+          f"kayıp: {result['lost']} ({result['loss_ratio'] * 100:.2f}%), tekrar: {result['duplicates']}")
+    if result['coordinators'] > 1:
+        print("Koordinatör başına alınan: " +
+              ', '.join(f"{port}: {count}" for port, count in sorted(result['received_per_coordinator'].items())))
+    print(f"Verim: {result['throughput']:.1f} kayıt/sn "
+          f"(üretici en fazla {result['generator_max_lag'] * 1000:.1f} ms geride kaldı)")
+    print(f"Gecikme: p50 {ms(latency['p50'])}, p90 {ms(latency['p90'])}, "
+          f"p99 {ms(latency['p99'])}, max {ms(latency['max'])}")
+    print(f"CPU: ağ geçidi süreci %{result['cpu']['gateway_process_percent']:.1f}, "
+          f"sunucu süreci %{result['cpu']['server_process_percent']:.1f}")
+    print(f"Çalışma dizini: {result['workdir']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Sensör veri hattı uçtan uca yük testi')
+    parser.add_argument('--nodes', type=int, default=20, help='Sahte düğüm sayısı')
+    parser.add_argument('--coordinators', type=int, default=1, help='Sahte koordinatör (seri port) sayısı')
+    parser.add_argument('--rate', type=float, default=50, help='Toplam satır/saniye')
+    parser.add_argument('--duration', type=float, default=30, help='Üretim süresi (saniye)')
+    parser.add_argument('--scenario', choices=('steady', 'outage'), default='steady')
+    parser.add_argument('--outage-at', type=float, default=0.3, help='Kesintinin başladığı an (sürenin oranı)')
+    parser.add_argument('--outage-length', type=float, default=10, help='Kesinti süresi (saniye)')
+    parser.add_argument('--backoff-base', type=float, default=1, help='Devre kesici ilk bekleme süresi (saniye)')
+    parser.add_argument('--drain-timeout', type=float, default=60, help='Üretim bittikten sonra en fazla bekleme (saniye)')
+    parser.add_argument('--poll-interval', type=float, default=0.01, help='Sunucu veritabanı okuma aralığı (saniye)')
+    parser.add_argument('--binary', action='store_true', help='Koordinatörler ikili çerçeve yazsın')
+    parser.add_argument('--json', action='store_true', help='Sonucu JSON olarak yazdır')
+    args = parser.parse_args()
+    if args.binary and args.rate * args.duration > 0x7FFF:
+        # Sıra numarası çerçevede int16 TX_drift alanında taşınır
+        parser.error('--binary ile en fazla 32767 satır gönderilebilir')
+
+    result = run_benchmark(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,75 @@ struct __attribute__((__packed__)) sensor_packet {
 #define UDP_CLIENT_PORT	8765
 #define UDP_SERVER_PORT	5678
 
+/* Seri çıktı formatı: 0 metin satırları, 1 ikili çerçeveler (project-conf.h) */
+#ifndef COORDINATOR_BINARY_SERIAL
+#define COORDINATOR_BINARY_SERIAL 0
+#endif
+
+#if COORDINATOR_BINARY_SERIAL
+/*
+ * İkili çerçeve: [tip][alanlar, little-endian][CRC16-CCITT, little-endian]
+ * COBS ile kodlanır (içinde 0x00 kalmaz), başına ve sonuna 0x00 konur.
+ * Ağ geçidi 0x00 görünce ikili moda geçer; metin satırları aynı portta çalışmaya devam eder.
+ * Okuma çerçevesi: node_id u16, light u16, temperature i16, humidity_air u16 (100x),
+ * humidity_ground u16 (%), rx_drift i16, tx_drift i16 -> 17 byte (metin satırı ~100 byte)
+ */
+#define FRAME_TYPE_READING 0x01
+#define FRAME_MAX_LENGTH 32
+
+static uint16_t
+crc16_ccitt(const uint8_t *data, uint8_t len)
+{
+  uint16_t crc = 0xFFFF;
+  uint8_t i;
+
+  while(len--) {
+    crc ^= (uint16_t)*data++ << 8;
+    for(i = 0; i < 8; i++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+static uint8_t
+put_u16(uint8_t *buf, uint8_t pos, uint16_t value)
+{
+  buf[pos] = value & 0xFF;
+  buf[pos + 1] = value >> 8;
+  return pos + 2;
+}
+
+static void
+write_frame(const uint8_t *raw, uint8_t len)
+{
+  uint8_t out[FRAME_MAX_LENGTH + 2];
+  uint8_t code_pos = 0;
+  uint8_t code = 1;
+  uint8_t pos = 1;
+  uint8_t i;
+
+  /* COBS: her 0x00, sonraki 0x00'a (veya sona) olan uzaklıkla değiştirilir */
+  for(i = 0; i < len; i++) {
+    if(raw[i] == 0) {
+      out[code_pos] = code;
+      code_pos = pos++;
+      code = 1;
+    } else {
+      out[pos++] = raw[i];
+      code++;
+    }
+  }
+  out[code_pos] = code;
+
+  putchar(0);
+  for(i = 0; i < pos; i++) {
+    putchar(out[i]);
+  }
+  putchar(0);
+}
+#endif
+
 static struct simple_udp_connection udp_conn;
 
 PROCESS(udp_server_process, "UDP server");
@@ -43,6 +112,21 @@ udp_rx_callback(struct simple_udp_connection *c,
     int16_t rx_drift = UIP_HTONS(pkt->rx_drift);
     int16_t tx_drift = UIP_HTONS(pkt->tx_drift);
     
+#if COORDINATOR_BINARY_SERIAL
+    uint8_t frame[FRAME_MAX_LENGTH];
+    uint8_t len = 0;
+
+    frame[len++] = FRAME_TYPE_READING;
+    len = put_u16(frame, len, node_id);
+    len = put_u16(frame, len, light);
+    len = put_u16(frame, len, (uint16_t)temperature);
+    len = put_u16(frame, len, humidity_air);
+    len = put_u16(frame, len, humidity_ground > 0xFFFF ? 0xFFFF : (uint16_t)humidity_ground);
+    len = put_u16(frame, len, (uint16_t)rx_drift);
+    len = put_u16(frame, len, (uint16_t)tx_drift);
+    len = put_u16(frame, len, crc16_ccitt(frame, len));
+    write_frame(frame, len);
+#else
     printf("Node %d: Light=%d.%02d, Temp=%d.%02d, Humid_air=%d.%02d, Humid_ground=%ld%%, RX_drift=%d, TX_drift=%d\n",
            node_id,
            light/100, light%100,
@@ -50,6 +134,7 @@ udp_rx_callback(struct simple_udp_connection *c,
            humidity_air/100, humidity_air%100,
            humidity_ground,
            rx_drift, tx_drift);
+#endif
   } else {
     printf("Invalid packet size received: %d bytes\n", datalen);
   }
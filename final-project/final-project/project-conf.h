@@ -16,6 +16,9 @@
 
 #define CLOCK_DRIFT_MONITOR 1
 
+/* Koordinatör seri çıktısı: 1 ise okumalar ikili (COBS + CRC16) çerçeve olarak yazılır */
+#define COORDINATOR_BINARY_SERIAL 0
+
 #define UIP_CONF_BUFFER_SIZE 200
 #define SICSLOWPAN_CONF_FRAG 0
 
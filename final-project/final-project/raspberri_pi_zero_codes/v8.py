@@ -1,387 +1,2135 @@
 #!/usr/bin/env python3
 
+import time
+STARTUP_T0 = time.perf_counter()  # Açılış süreleri bu andan itibaren ölçülür
+
 import serial
-import requests
 import json
+import struct
+import binascii
+import logging
+import logging.handlers
+import atexit
+import sys
+import gzip
 import sqlite3
-import time
+import random
 import re
+import threading
+import queue
+import heapq
+import uuid
 from datetime import datetime
 import os
 
+# requests (ve metrik sunucusu için http.server) açılışta yüklenmez: Pi Zero'da import
+# birkaç saniye sürer, seri port bu sırada açılmamış olursa koordinatör çıktısı kaybolur.
+# Yükleyici thread'i ilk iş olarak init_session() ile yükler.
+requests = None
+
 # Seri port ayarları
-SERIAL_PORT = '/dev/ttyACM0'     # Veya '/dev/serial0', '/dev/ttyAMA0'
+# Her koordinatör için bir port; her port ayrı thread'de okunur, kayıtlar port adıyla etiketlenir
+SERIAL_PORTS = ['/dev/ttyACM0']     # Veya '/dev/serial0', '/dev/ttyAMA0'
 BAUD_RATE = 115200
+SERIAL_READ_TIMEOUT = 1  # Veri yokken okuma en fazla bu kadar saniye bekler
+MAX_LINE_LENGTH = 1024  # Satır sonu gelmeden bu boyutu aşan veri çöp sayılır
+MAX_FRAME_LENGTH = 64  # İkili çerçeve sonu (0x00) gelmeden bu boyutu aşan veri çöp sayılır
+SERIAL_RETRY_BASE = 2  # Port açılamazsa ilk yeniden deneme süresi (saniye), her denemede iki katına çıkar
+SERIAL_RETRY_MAX = 60  # En uzun yeniden deneme süresi (saniye)
+
+# Ağ geçidi kimliği: sunucu kayıtları (gateway_id, seq) ile tekilleştirir,
+# zaman aşımı sonrası tekrar gönderilen kayıtlar çift kaydedilmez
+GATEWAY_ID = ''  # '' : ilk çalıştırmada üretilir ve yerel veritabanında saklanır
+SEQ_RESERVE_BLOCK = 1000  # Sıra numaraları veritabanına bu büyüklükte bloklar halinde ayrılır
 
 # HTTP hedef ayarları
-TARGET_URL = 'http://10.142.1.191:5000/data'  # HTTP URL
-ERROR_URL = 'http://10.142.1.191:5000/error'  # Hata bildirimi için endpoint
+V2_URL = 'http://10.142.1.191:5000/v2/data'  # Toplu veri gönderimi için endpoint (v2 formatı)
+PING_URL = 'http://10.142.1.191:5000/ping'  # Bağlantı kontrolü için endpoint
+
+# Toplu gönderim ayarları
+BATCH_MAX_SIZE = 200  # Tek istekte gönderilecek en fazla kayıt
+BATCH_MAX_WAIT = 2.0  # Canlı veriler en fazla bu kadar saniye bekletilir
+UPLOAD_GZIP_LEVEL = 6  # İstek gövdesi gzip sıkıştırma seviyesi (0: sıkıştırma yok)
+UPLOAD_MAX_BYTES = 1024 * 1024  # Sıkıştırılmadan önceki en fazla gövde boyutu, aşılırsa parça ikiye bölünür
+                                # (sunucu açılmış gövdeyi MAX_DECOMPRESSED_BYTES ile sınırlar)
+UPLOAD_RETRY_STATUSES = (408, 429)  # 5xx dışında yeniden denenecek yanıtlar; diğer 4xx'ler karantinaya alınır
+
+# Uçta toplama (edge aggregation) ayarları
+EDGE_AGGREGATION_WINDOW = 0  # Saniye; 0: kapalı, her okuma ayrı gönderilir.
+                             # Açıkken düğüm başına her pencerede tek özet gönderilir.
+AGGREGATED_METRICS = ('light', 'temperature', 'humidity_air',
+                      'humidity_ground', 'rx_drift', 'tx_drift')
+
+# Ölü bant (deadband) sıkıştırma ayarları
+# Metrik -> tolerans. Boşsa kapalı. Listelenen tüm metrikler son gönderilen değerden
+# en fazla tolerans kadar farklıysa okuma gönderilmez. Listelenmeyen metrikler karşılaştırılmaz.
+# Örnek: {'light': 0.5, 'temperature': 0.1, 'humidity_air': 0.5, 'humidity_ground': 1}
+DEADBAND_TOLERANCES = {}
+DEADBAND_HEARTBEAT = 600  # Değişiklik olmasa da düğüm başına en az bu aralıkla bir okuma gönderilir (saniye)
+UPLOAD_QUEUE_SIZE = 1000  # Seri okuyucu ile yükleyici arasındaki kuyruk kapasitesi
+
+# Devre kesici ayarları
+BREAKER_FAILURE_THRESHOLD = 3  # Art arda bu kadar hatadan sonra devre açılır
+BREAKER_BACKOFF_BASE = 5  # İlk bekleme süresi (saniye), her açılışta iki katına çıkar
+BREAKER_BACKOFF_MAX = 300  # En uzun bekleme süresi (saniye)
 
 # SQLite veritabanı ayarları
 DB_PATH = 'offline_data.db'
+SPOOL_COMMIT_INTERVAL = 5.0  # Yerel kayıtlar en fazla bu kadar saniye commit edilmeden bekler
+SPOOL_COMMIT_MAX_ROWS = 500  # Bu kadar kayıt birikince süre beklenmeden commit edilir
+SPOOL_SYNCHRONOUS = 'NORMAL'  # WAL ile NORMAL: her commit'te fsync yapılmaz (SD kart ömrü)
+
+# Yerel veritabanı bütçesi (uzun kesintilerde SD kartın dolmasını önler)
+SPOOL_MAX_ROWS = 500000  # Tutulacak en fazla kayıt
+SPOOL_MAX_AGE = 14 * 24 * 3600  # Bundan eski kayıtlar silinir (saniye)
+SPOOL_MAX_BYTES = 64 * 1024 * 1024  # Yerel veritabanındaki kayıtların kapladığı en fazla yer (boş sayfalar hariç)
+SPOOL_DOWNSAMPLE_BUCKET = 600  # Seyreltmede düğüm başına bu aralıkta tek ortalama kayıt kalır (saniye)
+SPOOL_DOWNSAMPLE_FRACTION = 0.5  # Bütçe aşılınca kayıtların en eski bu oranı seyreltilir
+SPOOL_CHECK_INTERVAL = 60  # Bütçe kontrol aralığı (saniye)
+# Bütçe aşılınca en eski kaydı tutan tablodan silinir: tablo -> bekleyen kayıt sayacı
+SPOOL_EVICTION_TABLES = {
+    'offline_readings': 'pending_count',
+    'offline_summaries': 'pending_summary_count',
+    'offline_records': 'pending_record_count',
+}
+
+# Sensör kaydının alanları (yerel veritabanında ayrı sütunlar olarak tutulur)
+READING_FIELDS = ('node_id', 'light', 'temperature', 'humidity_air',
+                  'humidity_ground', 'rx_drift', 'tx_drift', 'timestamp', 'coordinator', 'seq')
+SPOOL_INSERT_SQL = (
+    f"INSERT INTO offline_readings ({', '.join(READING_FIELDS)}, created_at) "
+    f"VALUES ({', '.join('?' * (len(READING_FIELDS) + 1))})"
+)
+# Sunucuya gönderilen alanlar: sample_count seyreltilmiş (ortalama) kaydın kaç okumadan oluştuğunu bildirir
+UPLOAD_READING_FIELDS = READING_FIELDS + ('sample_count',)
+
+# Diğer koordinatör yazılımlarının kayıt türleri ve alanları (FirmwareParser üretir).
+# Sunucuda her tür ayrı tabloya yazılır; yerel veritabanında offline_records tablosunda JSON olarak bekler.
+RECORD_FIELDS = {
+    'drift': ('node_id', 'current_drift', 'estimated_drift', 'node_timestamp', 'valid',
+              'timestamp', 'coordinator', 'seq'),
+    'environment': ('node_id', 'metric', 'value', 'timestamp', 'coordinator', 'seq'),
+    'energest': ('node_id', 'total_cpu', 'total_lpm', 'total_deep_lpm', 'total_tx', 'total_rx',
+                 'total_listen', 'timestamp', 'coordinator', 'seq'),
+}
+RECORD_INSERT_SQL = "INSERT INTO offline_records (kind, data, created_at, seq) VALUES (?, ?, ?, ?)"
+
+# Pencere özeti alanları (düğüm + metrik başına bir satır)
+SUMMARY_FIELDS = ('node_id', 'metric', 'window_start', 'window_end',
+                  'count', 'min', 'max', 'mean', 'last', 'seq')
+SUMMARY_INSERT_SQL = (
+    f"INSERT INTO offline_summaries ({', '.join(SUMMARY_FIELDS)}, created_at) "
+    f"VALUES ({', '.join('?' * (len(SUMMARY_FIELDS) + 1))})"
+)
+
+# Birleştirilmiş hata kaydı alanları (tip başına pencerede bir satır)
+ERROR_FIELDS = ('error_type', 'error_message', 'count', 'first_seen', 'last_seen', 'seq')
+
+# Metrik ayarları
+METRICS_SNAPSHOT_PATH = 'gateway_metrics.json'  # Periyodik metrik dosyası ('' : kapalı)
+METRICS_SNAPSHOT_INTERVAL = 30  # Metrik dosyası yazma ve hız hesaplama aralığı (saniye)
+METRICS_HTTP_PORT = 0  # 127.0.0.1 üzerinde /metrics sunan port (0: kapalı)
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)  # Histogram üst sınırları (saniye)
 
 # Hata kontrol ayarları
 DATA_TIMEOUT = 600  # 10 dakika (saniye cinsinden)
 ERROR_REPORT_INTERVAL = 600  # 10 dakika (saniye cinsinden) - Hata mesajı gönderme aralığı
+ERROR_COALESCE_WINDOW = 60  # Aynı tipteki hatalar bu süre boyunca birleştirilip tek kayıt olarak gönderilir (saniye)
+ERROR_MESSAGE_SEPARATOR = ' | '  # Birleştirilen kayıtta farklı mesajlar bu ayraçla tutulur
+ERROR_MESSAGE_MAX_LENGTH = 1000  # Birleştirilmiş mesajın en fazla uzunluğu, aşılırsa '...' ile kesilir
+NODE_TIMEOUT = 300  # Bir düğümden bu kadar saniye veri gelmezse node_timeout bildirilir (0: kapalı)
+
+# Günlük (log) ayarları
+LOG_LEVEL = 'INFO'  # Okuma başına mesajlar DEBUG seviyesindedir, üretimde yazılmaz
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(threadName)s] %(message)s'
+LOG_RATE_LIMIT = 20  # Aynı mesaj şablonundan LOG_RATE_INTERVAL içinde en fazla bu kadar yazılır (0: sınırsız)
+LOG_RATE_INTERVAL = 60  # saniye
+LOG_SAMPLING = {}  # Mesaj şablonu -> N: şablonun her N mesajından yalnızca biri yazılır
+                   # Örnek: {'İşlenen veri: %s': 100}
+LOG_QUEUE_SIZE = 10000  # Yazılmayı bekleyen en fazla kayıt, kuyruk doluysa yeni kayıtlar atılır
+
+logger = logging.getLogger('gateway')
+
+class LogRateLimiter(logging.Filter):
+    """
+    Mesaj şablonu başına örnekleme ve hız sınırı (thread güvenli).
+    Şablon, çağrıdaki biçimlendirilmemiş mesajdır ('Seri port açılamadı: %s'); değişken
+    kısımları farklı olsa da aynı mesaj tek grup sayılır. Sınır yüzünden atlanan mesajların
+    sayısı, yeni aralıkta yazılan ilk mesaja eklenir.
+    """
+
+    def __init__(self, rate_limit, interval, sampling):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.interval = interval
+        self.sampling = sampling
+        self.lock = threading.Lock()
+        self.windows = {}  # şablon -> [aralık başlangıcı, yazılan, atlanan]
+        self.sample_counts = {}  # şablon -> görülen mesaj sayısı
+
+    def filter(self, record):
+        template = record.msg
+        suppressed = 0
+        with self.lock:
+            every = self.sampling.get(template)
+            if every:
+                seen = self.sample_counts.get(template, 0)
+                self.sample_counts[template] = seen + 1
+                if seen % every:
+                    return False
+
+            if self.rate_limit:
+                window = self.windows.get(template)
+                if window is None or record.created - window[0] >= self.interval:
+                    suppressed = window[2] if window else 0
+                    self.windows[template] = [record.created, 1, 0]
+                elif window[1] < self.rate_limit:
+                    window[1] += 1
+                else:
+                    window[2] += 1
+                    return False
+
+        if suppressed and isinstance(record.args, tuple):
+            record.msg = f'{template} (önceki aralıkta %d benzer mesaj atlandı)'
+            record.args = record.args + (suppressed,)
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Kaydı biçimlendirmeden kuyruğa bırakır. Varsayılan QueueHandler mesajı çağıran
+    thread'de biçimlendirir; burada biçimlendirme de yazma da dinleyici thread'inde
+    yapılır, çağıran thread stdout'u (journald) beklemez. Kuyruk doluysa kayıt atılır.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def setup_logging(level=LOG_LEVEL):
+    """
+    Günlük hattını kur: thread'ler kayıtları filtreleyip kuyruğa bırakır,
+    tek bir dinleyici thread'i biçimlendirip stdout'a yazar.
+    """
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(LogRateLimiter(LOG_RATE_LIMIT, LOG_RATE_INTERVAL, LOG_SAMPLING))
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)  # Kapanışta kuyrukta kalanlar yazılır
+    return listener
+
+
+class LineFramer:
+    """
+    Seri porttan gelen byte akışını satırlara ve ikili çerçevelere böler.
+    Tampon bytearray'dir: yeni veri sona eklenir, tamamlanan satırlar baştan silinir,
+    yarım kalan satır her seferinde yeniden kopyalanmaz ve baştan taranmaz.
+
+    Metin satırlarında hiç 0x00 bulunmaz; ikili modda derlenen koordinatör her çerçeveyi
+    0x00 ile başlatıp bitirir (COBS kodlaması çerçevenin içinde 0x00 bırakmaz). 0x00 görülünce
+    ikili moda geçilir ve sonraki 0x00'a kadar olan kısım çerçevedir; çerçeve içindeki
+    0x0A satır sonu sayılmaz. Böylece metin ve ikili koordinatörler aynı okuyucuyla çalışır.
+    Ayraç kaybolursa boş çerçeveler ikili modda kalmayı sağlar, CRC hatalı aday atılır ve
+    en geç bir sonraki çerçevede yeniden senkronize olunur. Metin akışındaki tek bir 0x00
+    yüzünden açılan çerçeve max_frame_length'i aşınca metin moduna dönülür ve satırlar kaybolmaz.
+    """
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH, max_frame_length=MAX_FRAME_LENGTH):
+        self.buffer = bytearray()
+        self.scan_from = 0  # Önceki çağrıda satır sonu aranmış kısım
+        self.max_line_length = max_line_length
+        self.max_frame_length = max_frame_length
+        self.in_frame = False  # Son ayraçtan sonra ikili çerçeve içinde miyiz
+
+    def feed(self, chunk):
+        """Yeni gelen byte'ları ekle, tamamlanan satırları ve ikili çerçeveleri (bytes) döndür"""
+        buffer = self.buffer
+        buffer += chunk
+        lines = []
+        frames = []
+        start = 0
+        scan_from = self.scan_from
+
+        while True:
+            zero = buffer.find(b'\0', scan_from)
+            if self.in_frame:
+                if zero < 0:
+                    if len(buffer) - start <= self.max_frame_length:
+                        break
+                    # Çerçeve bu kadar uzun olamaz: 0x00 metin akışındaki tek bir bozuk byte'tı
+                    # (ya da bitiş ayracı kayboldu). Ayraçtan sonrası metin olarak yeniden taranır.
+                    self.in_frame = False
+                    scan_from = start
+                    continue
+                if zero > start:
+                    # Çerçeve tamamlandı, sonraki ayraca kadar metin modu
+                    frames.append(bytes(buffer[start:zero]))
+                    self.in_frame = False
+                # Boş çerçeve: önceki çerçevenin bitişi ile sonrakinin başlangıcı arası
+                start = scan_from = zero + 1
+                continue
+
+            end = buffer.find(b'\n', scan_from, zero if zero >= 0 else len(buffer))
+            if end >= 0:
+                lines.append(bytes(buffer[start:end]))
+                start = scan_from = end + 1
+            elif zero >= 0:
+                # Satır sonu olmadan gelen ayraç: öncesi başlangıç ayracı kaybolmuş bir
+                # çerçeve olabilir, CRC kontrolüne aday olarak verilir
+                if zero > start:
+                    frames.append(bytes(buffer[start:zero]))
+                self.in_frame = True
+                start = scan_from = zero + 1
+            else:
+                break
+
+        if start:
+            # Baştan silme bytearray'de kopyalama gerektirmez
+            del buffer[:start]
+        self.scan_from = len(buffer)
+
+        if not self.in_frame and len(buffer) > self.max_line_length:
+            # Satır sonu / ayraç hiç gelmiyorsa tampon sınırsız büyümesin
+            del buffer[:]
+            self.scan_from = 0
+
+        return lines, frames
+
+def cobs_decode(data):
+    """COBS ile kodlanmış çerçeveyi çöz, bozuksa None döndür"""
+    output = bytearray()
+    index = 0
+    length = len(data)
+    while index < length:
+        code = data[index]
+        end = index + code
+        if code == 0 or end > length:
+            return None
+        output += data[index + 1:end]
+        index = end
+        if code < 0xFF and index < length:
+            output.append(0)
+    return bytes(output)
+
+class FirmwareParser:
+    """
+    Koordinatör yazılımlarının çıktısını kayıtlara çeviren tablo tabanlı ayrıştırıcı.
+    Satırın ilk kelimesi LINE_PARSERS tablosundan yalnızca o kelimeyle başlayan
+    (önceden derlenmiş) desenleri seçer; satır başına tek sözlük araması ve çoğunlukla
+    tek regex denemesi yapılır. Çok satırlı kayıtlar ve açılışta yazılan düğüm kimliği
+    için durum tutar, bu yüzden her seri port kendi örneğini kullanır.
+
+    Kapsanan yazılımlar: final-project/coordinator.c, clock-drift/coordinator.c ve
+    energest_batarya (energest-advanced, energest-udp, energest-monitor, energest-simple).
+    Açılış ve bilgi satırları (ör. 'Clock frequency: ...') tanınmaz.
+
+    parse() (tür, kayıt) listesi döndürür: tanınan ama kayıt üretmeyen satırda boş liste,
+    tanınmayan satırda None.
+    """
+
+    # final-project/coordinator.c
+    # Node 17277: Light=14.69, Temp=29.71, Humid_air=54.27, Humid_ground=100%, RX_drift=6, TX_drift=0
+    READING_PATTERN = re.compile(
+        r'Node\s+(\d+):\s+Light=([0-9.]+),\s+Temp=([0-9.]+),\s+Humid_air=([0-9.]+),'
+        r'\s+Humid_ground=([0-9]+)%,\s+RX_drift=([0-9-]+),\s+TX_drift=([0-9-]+)'
+    )
+
+    # Tablo: ilk kelime -> (desen, işleyici metodu). Aynı kelime için desenler sırayla denenir.
+    LINE_PARSERS = (
+        ('Node', READING_PATTERN, 'parse_reading'),
+        # clock-drift/coordinator.c: çok satırlı blok
+        ('[COORDINATOR]', re.compile(r'\[COORDINATOR\] Received drift from node (\d+):'), 'start_drift'),
+        ('[COORDINATOR]', re.compile(r'\[COORDINATOR\] Received invalid packet size'), 'ignore'),
+        ('Current', re.compile(r'Current Drift: (-?\d+)$'), 'drift_current'),
+        ('Estimated', re.compile(r'Estimated Drift: (-?\d+)$'), 'drift_estimated'),
+        ('Timestamp:', re.compile(r'Timestamp: (\d+)$'), 'drift_timestamp'),
+        ('Valid:', re.compile(r'Valid: (Yes|No)$'), 'drift_valid'),
+        ('From:', re.compile(r'From:'), 'ignore'),
+        # Aynı bilginin LOG_INFO kopyası, blok zaten kaydedildi
+        ('[INFO:', re.compile(r'\[INFO: Coordinator\s*\] Node \d+ drift:'), 'ignore'),
+        # energest_batarya: açılış satırı, sensör satırları ve gönderilen JSON
+        ('Node', re.compile(r'Node ID: (\d+)$'), 'node_id_announce'),
+        ('HDC:', re.compile(r'HDC: (Temp|Humidity)=(-?\d+\.\d+)'), 'parse_hdc'),
+        ('OPT:', re.compile(r'OPT: Light=(-?\d+\.\d+)'), 'parse_opt'),
+        ('Data', re.compile(r'Data sent: (\{.*\})$'), 'parse_sent_json'),
+        # energest_batarya/energest-udp.c: yalnızca toplamları içeren JSON
+        ('Energest', re.compile(r'Energest data sent: (\{.*\})$'), 'parse_energest_json'),
+        # energest-monitor.c ve energest-simple.c: çok satırlı toplam blokları
+        ('===', re.compile(r'=== (Cumulative Values|Energest Values) ===$'), 'start_energest'),
+        ('Total', re.compile(r'Total (CPU|LPM|Deep LPM|TX|RX|Listen):\s*(\d+) ticks$'), 'energest_field'),
+        ('CPU:', re.compile(r'(CPU):\s+(\d+) ticks$'), 'energest_field'),
+        ('LPM:', re.compile(r'(LPM):\s+(\d+) ticks$'), 'energest_field'),
+        ('TX:', re.compile(r'(TX):\s+(\d+) ticks$'), 'energest_field'),
+        ('RX:', re.compile(r'(RX):\s+(\d+) ticks$'), 'energest_field'),
+        # energest-monitor.c'nin aralık (delta) bloğu toplamların tekrarı, kaydedilmez
+        ('===', re.compile(r'=== Energest Measurements'), 'ignore'),
+        ('CPU', re.compile(r'CPU Active:'), 'ignore'),
+        ('LPM:', re.compile(r'LPM:\s+\d+ ticks \('), 'ignore'),
+        ('Deep', re.compile(r'Deep LPM:'), 'ignore'),
+        ('Radio', re.compile(r'Radio (TX|RX|Listen):'), 'ignore'),
+        ('Total', re.compile(r'Total Time:'), 'ignore'),
+        # Blok sonu çizgileri (monitor 48, simple 23 karakter)
+        ('=' * 48, re.compile(r'=+$'), 'ignore'),
+        ('=' * 23, re.compile(r'=+$'), 'ignore'),
+    )
+    # İkili çerçeveler: tip -> (alan düzeni, işleyici metodu). Tip byte'ından sonra gelir,
+    # sonunda tip + alanlar üzerinden CRC16-CCITT (little-endian) bulunur.
+    FRAME_PARSERS = {
+        0x01: (struct.Struct('<HHhHHhh'), 'frame_reading'),
+    }
+    HDC_METRICS = {'Temp': 'temperature', 'Humidity': 'humidity'}
+    ENERGEST_TOTALS = ('total_cpu', 'total_lpm', 'total_deep_lpm', 'total_tx', 'total_rx', 'total_listen')
+    ENERGEST_LABELS = {'CPU': 'total_cpu', 'LPM': 'total_lpm', 'Deep LPM': 'total_deep_lpm',
+                       'TX': 'total_tx', 'RX': 'total_rx', 'Listen': 'total_listen'}
+    # Blok başlığı -> bloğun son satırının etiketi (energest-simple.c Deep LPM ve Listen yazmaz)
+    ENERGEST_BLOCKS = {'Cumulative Values': 'Listen', 'Energest Values': 'RX'}
 
-class SensorDataSender:
     def __init__(self):
-        self.init_database()
-        self.serial_connected = False
+        self.node_id = None  # energest yazılımının açılışta yazdığı / gönderdiği düğüm kimliği
+        self.drift = None  # Tamamlanmamış sürüklenme bloğu
+        self.energest = None  # Tamamlanmamış energest bloğu: (son etiket, kayıt)
+        self.dispatch = {}
+        for key, pattern, handler in self.LINE_PARSERS:
+            self.dispatch.setdefault(key, []).append((pattern.match, getattr(self, handler)))
+
+    def parse(self, line):
+        """Satırı ayrıştır, (tür, kayıt) listesi döndür (tanınmıyorsa None)"""
+        for match_line, handler in self.dispatch.get(line.partition(' ')[0], ()):
+            match = match_line(line)
+            if match:
+                return handler(match)
+        return None
+
+    def parse_frame(self, frame):
+        """İkili çerçeveyi çöz ve CRC'sini doğrula, (tür, kayıt) listesi döndür (bozuksa None)"""
+        data = cobs_decode(frame)
+        if data is None or len(data) < 3:
+            return None
+        if binascii.crc_hqx(data[:-2], 0xFFFF) != int.from_bytes(data[-2:], 'little'):
+            return None
+        parser = self.FRAME_PARSERS.get(data[0])
+        if parser is None or parser[0].size != len(data) - 3:
+            return None
+        layout, handler = parser
+        return getattr(self, handler)(layout.unpack_from(data, 1))
+
+    def frame_reading(self, values):
+        # Sabit noktalı alanlar (100x) metin formatıyla aynı değerlere çevrilir
+        node_id, light, temperature, humidity_air, humidity_ground, rx_drift, tx_drift = values
+        return [('reading', {
+            'node_id': node_id,
+            'light': light / 100,
+            'temperature': temperature / 100,
+            'humidity_air': humidity_air / 100,
+            'humidity_ground': humidity_ground,
+            'rx_drift': rx_drift,
+            'tx_drift': tx_drift
+        })]
+
+    def parse_reading(self, match):
+        return [('reading', {
+            'node_id': int(match.group(1)),
+            'light': float(match.group(2)),
+            'temperature': float(match.group(3)),
+            'humidity_air': float(match.group(4)),
+            'humidity_ground': int(match.group(5)),
+            'rx_drift': int(match.group(6)),
+            'tx_drift': int(match.group(7))
+        })]
+
+    def ignore(self, match):
+        return []
+
+    def start_drift(self, match):
+        # Önceki blok yarım kaldıysa atılır
+        self.drift = {'node_id': int(match.group(1))}
+        return []
+
+    def drift_field(self, field, value):
+        if self.drift is not None:
+            self.drift[field] = value
+        return []
+
+    def drift_current(self, match):
+        return self.drift_field('current_drift', int(match.group(1)))
+
+    def drift_estimated(self, match):
+        return self.drift_field('estimated_drift', int(match.group(1)))
+
+    def drift_timestamp(self, match):
+        return self.drift_field('node_timestamp', int(match.group(1)))
+
+    def drift_valid(self, match):
+        """Bloğun son alanı: tüm alanlar geldiyse kaydı tamamla"""
+        drift, self.drift = self.drift, None
+        if drift is None or len(drift) != 4:
+            return []
+        drift['valid'] = match.group(1) == 'Yes'
+        return [('drift', drift)]
+
+    def node_id_announce(self, match):
+        self.node_id = int(match.group(1))
+        return []
+
+    def parse_hdc(self, match):
+        return [('environment', {
+            'node_id': self.node_id,
+            'metric': self.HDC_METRICS[match.group(1)],
+            'value': float(match.group(2))
+        })]
+
+    def parse_opt(self, match):
+        return [('environment', {'node_id': self.node_id, 'metric': 'light', 'value': float(match.group(1))})]
+
+    def parse_sent_json(self, match):
+        """
+        Düğümün gönderdiği JSON. Düğüm kimliği öğrenilir; enerji toplamları kayda çevrilir.
+        Sensör değerleri HDC/OPT satırlarından zaten alındığı için tekrar kaydedilmez.
+        """
+        try:
+            data = json.loads(match.group(1))
+            self.node_id = int(data['node_id'])
+            if not data.get('is_energest'):
+                return []
+            record = {'node_id': self.node_id}
+            for field in self.ENERGEST_TOTALS:
+                record[field] = int(data[field])
+            return [('energest', record)]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def parse_energest_json(self, match):
+        """energest-udp.c JSON'u: düğüm kimliği yazılmaz, bilinen kimlik (yoksa None) kullanılır"""
+        try:
+            data = json.loads(match.group(1))
+            record = {'node_id': self.node_id}
+            for field in self.ENERGEST_TOTALS:
+                record[field] = int(data[field])
+            return [('energest', record)]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def start_energest(self, match):
+        # Önceki blok yarım kaldıysa atılır; yazılmayan toplamlar None kalır
+        record = dict.fromkeys(self.ENERGEST_TOTALS)
+        record['node_id'] = self.node_id
+        self.energest = (self.ENERGEST_BLOCKS[match.group(1)], record)
+        return []
+
+    def energest_field(self, match):
+        """Blok satırı: son etiket gelince kaydı tamamla"""
+        if self.energest is None:
+            return []
+        last_label, record = self.energest
+        record[self.ENERGEST_LABELS[match.group(1)]] = int(match.group(2))
+        if match.group(1) != last_label:
+            return []
+        self.energest = None
+        return [('energest', record)]
+
+class NodeWindowAggregator:
+    """
+    Düğüm başına sabit (tumbling) zaman pencerelerinde her metrik için
+    sayı / en küçük / en büyük / ortalama / son değer tutar.
+    Pencere kapanınca düğüm için metrik başına bir özet kaydı üretilir.
+    """
+
+    def __init__(self, window, metrics=AGGREGATED_METRICS):
+        self.window = window
+        self.metrics = metrics
+        self.windows = {}  # node_id -> (pencere başlangıcı, {metrik: [sayı, min, max, toplam, son]})
+
+    def add(self, reading, now=None):
+        """Okumayı düğümün penceresine ekle, önceki pencere kapandıysa özetini döndür"""
+        now = time.time() if now is None else now
+        window_start = now - now % self.window
+        node_id = reading['node_id']
+        summaries = []
+
+        current = self.windows.get(node_id)
+        if current is not None and current[0] != window_start:
+            summaries = self.summarize(node_id, *current)
+            current = None
+        if current is None:
+            current = (window_start, {})
+            self.windows[node_id] = current
+
+        stats = current[1]
+        for metric in self.metrics:
+            value = reading[metric]
+            metric_stats = stats.get(metric)
+            if metric_stats is None:
+                stats[metric] = [1, value, value, value, value]
+            else:
+                metric_stats[0] += 1
+                if value < metric_stats[1]:
+                    metric_stats[1] = value
+                if value > metric_stats[2]:
+                    metric_stats[2] = value
+                metric_stats[3] += value
+                metric_stats[4] = value
+
+        return summaries
+
+    def flush_expired(self, now=None, force=False):
+        """Süresi dolan (force ile tüm) pencereleri kapat, özetlerini döndür"""
+        now = time.time() if now is None else now
+        summaries = []
+        for node_id, (window_start, stats) in list(self.windows.items()):
+            if force or window_start + self.window <= now:
+                summaries.extend(self.summarize(node_id, window_start, stats))
+                del self.windows[node_id]
+        return summaries
+
+    def summarize(self, node_id, window_start, stats):
+        """Pencere istatistiklerini metrik başına özet kayıtlarına çevir"""
+        start = datetime.fromtimestamp(window_start).isoformat()
+        end = datetime.fromtimestamp(window_start + self.window).isoformat()
+        return [
+            {
+                'node_id': node_id,
+                'metric': metric,
+                'window_start': start,
+                'window_end': end,
+                'count': count,
+                'min': minimum,
+                'max': maximum,
+                'mean': total / count,
+                'last': last
+            }
+            for metric, (count, minimum, maximum, total, last) in stats.items()
+        ]
+
+class DeadbandFilter:
+    """
+    Düğüm ve metrik başına ölü bant sıkıştırma.
+    Bir okuma yalnızca bir metrik son gönderilen değerden toleranstan fazla saptığında
+    veya DEADBAND_HEARTBEAT süresi dolduğunda gönderilir. Sunucuda her değer bir sonraki
+    kayda kadar geçerli sayılarak (basamak) seri yeniden kurulabilir; hata toleransla sınırlıdır.
+    """
+
+    def __init__(self, tolerances, heartbeat):
+        self.tolerances = tuple(tolerances.items())
+        self.heartbeat = heartbeat
+        self.last_sent = {}  # node_id -> (gönderim zamanı, {metrik: değer})
+
+    def accept(self, reading, now=None):
+        """Okuma yeni bilgi taşıyorsa True döndür ve referans değerleri güncelle"""
+        now = time.time() if now is None else now
+        last = self.last_sent.get(reading['node_id'])
+
+        if last is not None and now - last[0] < self.heartbeat:
+            last_values = last[1]
+            for metric, tolerance in self.tolerances:
+                if abs(reading[metric] - last_values[metric]) > tolerance:
+                    break
+            else:
+                return False
+
+        self.last_sent[reading['node_id']] = (now, {metric: reading[metric] for metric, _ in self.tolerances})
+        return True
+
+def merge_error_message(current, new):
+    """
+    Birleştirilen kayda yeni mesajı ekle: farklı mesajlar (ör. farklı düğüm veya port)
+    sırayla tutulur, tekrarlar eklenmez, uzunluk ERROR_MESSAGE_MAX_LENGTH ile sınırlıdır.
+    """
+    if not current:
+        return new
+    parts = current.split(ERROR_MESSAGE_SEPARATOR)
+    for part in new.split(ERROR_MESSAGE_SEPARATOR) if new else ():
+        if part in parts:
+            continue
+        if parts[-1] == '...':
+            break
+        if len(ERROR_MESSAGE_SEPARATOR.join(parts + [part])) > ERROR_MESSAGE_MAX_LENGTH:
+            parts.append('...')
+            break
+        parts.append(part)
+    return ERROR_MESSAGE_SEPARATOR.join(parts)
+
+class ErrorCoalescer:
+    """
+    Hata olaylarını tipe göre pencerelerde birleştirir (thread güvenli).
+    Pencere ilk olayla açılır; pencere boyunca gelen aynı tipteki olaylar sayıyı ve son
+    görülme zamanını günceller, farklı mesajlar (hangi düğüm/port) kayıtta biriktirilir.
+    Böylece bağlantı ne kadar sık koparsa kopsun tip başına pencerede en fazla bir kayıt gönderilir.
+    Kayıt ilk gönderimde sıra numarası alır ve tekrar gönderimlerde onu korur; sayı birikimlidir,
+    sunucu aynı numara için daha önce işlediği sayıyı düşer (zaman aşımında çift sayılmaz).
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = {}  # error_type -> (pencere başlangıcı, kayıt sözlüğü)
+
+    def add(self, error_type, error_message, timestamp, now=None):
+        """Hata olayını tipinin penceresine ekle"""
+        now = time.time() if now is None else now
+        with self.lock:
+            current = self.pending.get(error_type)
+            if current is None:
+                self.pending[error_type] = (now, {
+                    'error_type': error_type,
+                    'error_message': error_message,
+                    'count': 1,
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'seq': None  # Gönderime çıkarken verilir
+                })
+            else:
+                error = current[1]
+                error['count'] += 1
+                error['error_message'] = merge_error_message(error['error_message'], error_message)
+                error['last_seen'] = timestamp
+
+    def due(self, now=None, force=False):
+        """Penceresi dolan (force ile tüm) kayıtları çıkarıp döndür"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if not self.pending:
+                return []
+            expired = [error_type for error_type, (opened_at, _) in self.pending.items()
+                       if force or opened_at + self.window <= now]
+            return [self.pending.pop(error_type)[1] for error_type in expired]
+
+    def restore(self, errors, now=None):
+        """
+        Gönderilemeyen kayıtları geri koy, o arada gelen aynı tip olaylarla birleştir.
+        Birleşen kayıt geri konanın sıra numarasını taşır: ilk gönderim sunucuya ulaştıysa
+        sunucu yalnızca sonradan eklenen sayıyı işler.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            for error in errors:
+                current = self.pending.get(error['error_type'])
+                if current is None:
+                    self.pending[error['error_type']] = (now, error)
+                else:
+                    newer = current[1]
+                    newer['count'] += error['count']
+                    newer['seq'] = error['seq']
+                    newer['error_message'] = merge_error_message(error['error_message'], newer['error_message'])
+                    newer['first_seen'] = min(newer['first_seen'], error['first_seen'])
+
+class NodeLivenessTracker:
+    """
+    Düğüm başına son görülme zamanı ve zaman aşımı takibi (thread güvenli).
+    Son tarihler bir min-heap'te tutulur, heap'te her düğüm için en fazla bir kayıt vardır.
+    Veri geldiğinde yalnızca son görülme zamanı güncellenir (heap'e dokunulmaz); süresi
+    dolan kayıt çekildiğinde düğüm bu arada görüldüyse yeni son tarihle geri konur.
+    Böylece kontrol tüm düğümleri taramaz, düğüm başına O(log n) iş yapılır.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.last_seen = {}  # node_id -> son veri zamanı
+        self.deadlines = []  # (son tarih, node_id) min-heap
+        self.down = set()  # Zaman aşımına uğramış düğümler
+
+    def touch(self, node_id, now=None):
+        """Düğümden veri geldi; düğüm sessizdiyse True döndür"""
+        now = time.time() if now is None else now
+        with self.lock:
+            scheduled = node_id in self.last_seen and node_id not in self.down
+            self.last_seen[node_id] = now
+            if scheduled:
+                return False
+            heapq.heappush(self.deadlines, (now + self.timeout, node_id))
+            if node_id in self.down:
+                self.down.discard(node_id)
+                return True
+            return False
+
+    def expired(self, now=None):
+        """Yeni zaman aşımına uğrayan düğümleri (node_id, sessiz geçen süre) listesi olarak döndür"""
+        now = time.time() if now is None else now
+        expired = []
+        with self.lock:
+            deadlines = self.deadlines
+            while deadlines and deadlines[0][0] <= now:
+                _, node_id = heapq.heappop(deadlines)
+                deadline = self.last_seen[node_id] + self.timeout
+                if deadline > now:
+                    # Düğüm bu arada görülmüş, gerçek son tarihle geri koy
+                    heapq.heappush(deadlines, (deadline, node_id))
+                else:
+                    self.down.add(node_id)
+                    expired.append((node_id, now - self.last_seen[node_id]))
+        return expired
+
+class GatewayMetrics:
+    """
+    Aşama başına sayaçlar ve gecikme histogramları (thread güvenli).
+    Sayaçlar toplam değerdir; hızlar (saniyede) update_rates() çağrıları arasındaki
+    farktan hesaplanır.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.started_at = time.time()
+        self.counters = {}
+        self.histograms = {}  # ad -> [kova sayıları..., +Inf, toplam süre, en büyük]
+        self.rates = {}
+        self.rates_counters = {}
+        self.rates_at = self.started_at
+
+    def incr(self, name, amount=1):
+        """Sayaç artır"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """Gecikme ölçümünü histograma ekle"""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = [0] * (len(self.buckets) + 1) + [0.0, 0.0]
+                self.histograms[name] = histogram
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    index = i
+                    break
+            histogram[index] += 1
+            histogram[-2] += seconds
+            if seconds > histogram[-1]:
+                histogram[-1] = seconds
+
+    def update_rates(self):
+        """Son çağrıdan bu yana sayaçların saniyedeki artışını hesapla"""
+        with self.lock:
+            now = time.time()
+            elapsed = now - self.rates_at
+            if elapsed <= 0:
+                return
+            self.rates = {
+                name: (value - self.rates_counters.get(name, 0)) / elapsed
+                for name, value in self.counters.items()
+            }
+            self.rates_counters = dict(self.counters)
+            self.rates_at = now
+
+    def snapshot(self, gauges=None):
+        """Tüm metriklerin JSON'a çevrilebilir kopyası"""
+        with self.lock:
+            latency = {}
+            for name, histogram in self.histograms.items():
+                count = sum(histogram[:-2])
+                buckets = {f'<={bound}': histogram[i] for i, bound in enumerate(self.buckets)}
+                buckets['+Inf'] = histogram[len(self.buckets)]
+                latency[name] = {
+                    'count': count,
+                    'mean': histogram[-2] / count if count else 0,
+                    'max': histogram[-1],
+                    'buckets': buckets
+                }
+            return {
+                'timestamp': datetime.now().isoformat(),
+                'uptime': time.time() - self.started_at,
+                'counters': dict(self.counters),
+                'rates': dict(self.rates),
+                'latency': latency,
+                'gauges': gauges or {}
+            }
+
+class SerialPortReader:
+    """
+    Tek bir koordinatörün seri portunu kendi thread'inde okur.
+    Tamamlanan satırlar port adıyla ortak işleme hattına (SensorDataSender.process_line) verilir.
+    Bağlantı koparsa port diğerlerinden bağımsız olarak artan bekleme süreleriyle yeniden açılır.
+    """
+
+    def __init__(self, port, sender):
+        self.port = port
+        self.sender = sender
+        self.ser = None
+        self.framer = LineFramer()
+        self.parser = FirmwareParser()  # Çok satırlı kayıtlar için porta özel durum tutar
+        self.connected = False
         self.last_data_time = None
+        self.last_chunk_time = None
         self.last_serial_error_time = 0
         self.last_data_timeout_error_time = 0
+        self.retry_count = 0  # Art arda başarısız açma denemesi (bekleme süresini belirler)
+        self.retry_at = 0
+        self.first_line_seen = False
+        self.binary_seen = False  # Koordinatör ikili çerçeve gönderiyor mu (otomatik algılanır)
+        self.thread = None
+
+    def open(self):
+        """Seri portu aç"""
+        try:
+            self.ser = serial.Serial(self.port, BAUD_RATE, timeout=SERIAL_READ_TIMEOUT)
+            self.framer = LineFramer()  # Yeni bağlantıda yarım satır taşınmaz
+            self.parser.drift = None  # Yarım kalan çok satırlı kayıt da taşınmaz
+            self.connected = True
+            self.retry_count = 0
+            self.last_data_time = time.time()  # Bağlantı kurulduğunda zamanı sıfırla
+            self.sender.mark_startup(f'serial_open:{self.port}')
+            logger.info("Seri port açıldı: %s", self.port)
+            return True
+        except serial.SerialException as e:
+            self.connected = False
+            self.schedule_retry()
+            logger.warning("Seri port açılamadı: %s", e)
+            return False
+
+    def close(self):
+        """Seri portu kapat"""
+        self.connected = False
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except:
+                pass
+            self.ser = None
+
+    def schedule_retry(self):
+        """Bir sonraki açma denemesini rastgele saçılımlı üstel beklemeyle planla"""
+        delay = min(SERIAL_RETRY_MAX, SERIAL_RETRY_BASE * (2 ** self.retry_count))
+        delay = random.uniform(delay / 2, delay)
+        self.retry_count += 1
+        self.retry_at = time.time() + delay
+
+    def report_serial_error(self, message):
+        """Seri port hatasını sunucuya bildir"""
+        self.last_serial_error_time = time.time()
+        self.sender.report_error('serial_port_error', f'{self.port}: {message}')
+
+    def read_lines(self):
+        """Veri gelene kadar (en fazla SERIAL_READ_TIMEOUT) bekle, tamamlanan satırları işle"""
+        # Uyanınca portta bekleyen her şeyi tek seferde al
+        chunk = self.ser.read(self.ser.in_waiting or 1)
+        if not chunk:
+            return
+
+        metrics = self.sender.metrics
+        now = time.time()
+        if self.last_chunk_time is not None:
+            metrics.observe('serial_gap', now - self.last_chunk_time)
+        self.last_chunk_time = now
+        metrics.incr('serial_bytes', len(chunk))
+
+        started = time.perf_counter()
+        lines, frames = self.framer.feed(chunk)
+        metrics.observe('framing', time.perf_counter() - started)
+        metrics.incr('lines', len(lines))
+
+        if (lines or frames) and not self.first_line_seen:
+            # Açılıştan (veya yeniden başlatmadan) ilk yakalanan satıra kadar geçen süre
+            self.first_line_seen = True
+            self.sender.mark_startup(f'first_line:{self.port}')
+
+        for raw_line in lines:
+            line = raw_line.decode(errors='ignore').strip()
+            if line and self.sender.process_line(line, self.port, self.parser):
+                # Veri gelme zamanını güncelle
+                self.last_data_time = now
+
+        for frame in frames:
+            if self.sender.process_frame(frame, self.port, self.parser):
+                if not self.binary_seen:
+                    self.binary_seen = True
+                    logger.info("İkili çerçeve formatı algılandı: %s", self.port)
+                self.last_data_time = now
+
+    def run(self, stop_event):
+        """Okuma döngüsü (ayrı thread)"""
+        if not self.open():
+            logger.error("Seri port bağlanamadı, ilk hata mesajı sunucuya gönderiliyor: %s", self.port)
+            self.report_serial_error('Seri port bağlantısı kurulamadı')
+
+        while not stop_event.is_set():
+            if not self.connected:
+                # Bağlı değilse bekleme süresi dolunca yeniden dene
+                if time.time() >= self.retry_at:
+                    logger.debug("Seri port bağlantısı deneniyor: %s", self.port)
+                    if self.open():
+                        logger.info("Seri port bağlantısı başarılı: %s", self.port)
+                stop_event.wait(0.5)
+                continue
+
+            try:
+                self.read_lines()
+            except serial.SerialException as e:
+                logger.error("Seri port okuma hatası (%s): %s", self.port, e)
+                self.close()
+                self.schedule_retry()
+                self.report_serial_error(f'Seri port bağlantısı kesildi: {str(e)}')
+
+        self.close()
+
+    def start(self, stop_event):
+        """Okuyucu thread'ini başlat"""
+        self.thread = threading.Thread(
+            target=self.run, args=(stop_event,), name=f'serial:{self.port}', daemon=True
+        )
+        self.thread.start()
+
+class CircuitBreaker:
+    """
+    Sunucu bağlantısı için devre kesici.
+    Kapalı: istekler normal gönderilir. Açık: istek yapılmaz, veriler yerelde tutulur.
+    Yarı açık: bekleme süresi doldu, tek bir ping ile sunucu yoklanır.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, backoff_base, backoff_max):
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.state = self.CLOSED
+        self.failures = 0  # Art arda başarısız istek sayısı
+        self.open_count = 0  # Art arda açılma sayısı (bekleme süresini belirler)
+        self.retry_at = 0
+
+    def allow_request(self):
+        """İstek yapılabilir mi? Açık devrenin süresi dolduysa yarı açığa geç"""
+        if self.state == self.OPEN and time.time() >= self.retry_at:
+            self.state = self.HALF_OPEN
+        return self.state != self.OPEN
+
+    def record_success(self):
+        """Başarılı istek, devreyi kapat"""
+        if self.state != self.CLOSED:
+            logger.info("Sunucu bağlantısı geri geldi, devre kapatıldı")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_count = 0
+
+    def record_failure(self):
+        """Başarısız istek, eşik aşıldıysa veya yoklama başarısızsa devreyi aç"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        """Devreyi aç, bir sonraki yoklamayı rastgele saçılımlı üstel beklemeyle planla"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** self.open_count))
+        # Saçılım: aynı anda açılan ağ geçitleri sunucuya aynı anda yüklenmesin
+        delay = random.uniform(delay / 2, delay)
+        self.open_count += 1
+        self.state = self.OPEN
+        self.retry_at = time.time() + delay
+        logger.warning("Sunucuya ulaşılamıyor, devre açıldı - %.0f saniye sonra tekrar denenecek", delay)
+
+class SensorDataSender:
+    def __init__(self):
+        self.db_lock = threading.Lock()  # Okuyucu ve yükleyici aynı bağlantıyı paylaşır
+        self.startup_lock = threading.Lock()
+        self.startup_timings = {}  # Açılış aşaması -> STARTUP_T0'dan geçen süre (saniye)
+        self.mark_startup('imports')
+        self.init_database()
+        self.mark_startup('database')
+        self.readers = [SerialPortReader(port, self) for port in SERIAL_PORTS]
+        self.reader_stop_event = threading.Event()
+        self.pending_batch = []  # Gönderilmeyi bekleyen canlı veriler
+        self.pending_summaries = []  # Gönderilmeyi bekleyen pencere özetleri
+        self.pending_records = []  # Gönderilmeyi bekleyen diğer kayıt türleri: (tür, kayıt)
+        self.pending_errors = []  # Gönderilmeyi bekleyen birleştirilmiş hata kayıtları
+        self.errors = ErrorCoalescer(ERROR_COALESCE_WINDOW)
+        self.aggregator = NodeWindowAggregator(EDGE_AGGREGATION_WINDOW) if EDGE_AGGREGATION_WINDOW > 0 else None
+        self.deadband = DeadbandFilter(DEADBAND_TOLERANCES, DEADBAND_HEARTBEAT) if DEADBAND_TOLERANCES else None
+        self.parser = FirmwareParser()  # Port belirtilmeden işlenen satırlar için
+        self.filter_lock = threading.Lock()  # Toplama ve ölü bant durumu okuyucu thread'lerince paylaşılır
+        self.batch_started_at = None
+        self.upload_queue = queue.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.session = None  # Keep-alive oturumu, yükleyici thread'inde açılır (init_session)
+        self.uploader_thread = None
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_BACKOFF_BASE, BREAKER_BACKOFF_MAX)
+        self.metrics = GatewayMetrics()
+        self.liveness = NodeLivenessTracker(NODE_TIMEOUT) if NODE_TIMEOUT > 0 else None
+        self.last_metrics_write_time = time.time()
 
     def init_database(self):
-        """SQLite veritabanını başlat"""
-        self.conn = sqlite3.connect(DB_PATH)
+        """SQLite veritabanını başlat (WAL modu, sütunlu kayıt tablosu)"""
+        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
         cursor = self.conn.cursor()
+        # Yeni veritabanında silinen kayıtların yeri incremental_vacuum ile diske geri verilir
+        # (tablolar oluşturulmadan önce ayarlanmalı, mevcut dosyada etkisizdir)
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SPOOL_SYNCHRONOUS}")
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS offline_data (
+            CREATE TABLE IF NOT EXISTS offline_readings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data TEXT NOT NULL,
+                node_id INTEGER NOT NULL,
+                light REAL,
+                temperature REAL,
+                humidity_air REAL,
+                humidity_ground INTEGER,
+                rx_drift INTEGER,
+                tx_drift INTEGER,
                 timestamp TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                created_at REAL NOT NULL,
+                sample_count INTEGER NOT NULL DEFAULT 1,
+                coordinator TEXT,
+                seq INTEGER
+            )
+        ''')
+        # Önceki sürümlerin tablosunda seyreltme, koordinatör ve sıra numarası sütunları yok
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(offline_readings)")}
+        if 'sample_count' not in columns:
+            cursor.execute("ALTER TABLE offline_readings ADD COLUMN sample_count INTEGER NOT NULL DEFAULT 1")
+        if 'coordinator' not in columns:
+            cursor.execute("ALTER TABLE offline_readings ADD COLUMN coordinator TEXT")
+        if 'seq' not in columns:
+            cursor.execute("ALTER TABLE offline_readings ADD COLUMN seq INTEGER")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS offline_summaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                node_id INTEGER NOT NULL,
+                metric TEXT NOT NULL,
+                window_start TEXT NOT NULL,
+                window_end TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                min REAL,
+                max REAL,
+                mean REAL,
+                last REAL,
+                created_at REAL NOT NULL,
+                seq INTEGER
+            )
+        ''')
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(offline_summaries)")}
+        if 'seq' not in columns:
+            cursor.execute("ALTER TABLE offline_summaries ADD COLUMN seq INTEGER")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS offline_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                seq INTEGER
+            )
+        ''')
+        # Sunucunun kalıcı olarak reddettiği (4xx) gönderimler: tekrar denenmez, incelenmek üzere saklanır
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rejected_uploads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status INTEGER NOT NULL,
+                response TEXT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS gateway_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
             )
         ''')
         self.conn.commit()
-        print(f"Veritabanı hazır: {DB_PATH}")
+        self.migrate_json_spool()
+        self.init_sequence()
+
+        # Grup commit: kayıtlar SPOOL_COMMIT_INTERVAL içinde toplu commit edilir
+        self.uncommitted_rows = 0
+        self.first_uncommitted_at = None
+
+        # Bekleyen kayıt sayısı bellekte tutulur, kayıt yoksa sorgu yapılmaz
+        cursor.execute("SELECT COUNT(*) FROM offline_readings")
+        self.pending_count = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM offline_summaries")
+        self.pending_summary_count = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM offline_records")
+        self.pending_record_count = cursor.fetchone()[0]
+        self.drain_watermark = 0  # Gönderilip silinen son kaydın id'si
+        self.last_budget_check_time = 0
+        logger.info("Veritabanı hazır: %s (%d bekleyen kayıt)", DB_PATH, self.pending_count)
         
-    def init_serial(self):
-        """Seri portu başlat"""
-        try:
-            self.ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-            self.serial_connected = True
-            print(f"Seri port açıldı: {SERIAL_PORT}")
-            return True
-        except serial.SerialException as e:
-            self.serial_connected = False
-            print(f"Seri port açılamadı: {e}")
-            return False
-            
+    def migrate_json_spool(self):
+        """Eski sürümün JSON metin olarak tuttuğu offline_data tablosunu yeni tabloya taşı"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='offline_data'")
+        if cursor.fetchone() is None:
+            return
+
+        rows = []
+        for data, timestamp in cursor.execute("SELECT data, timestamp FROM offline_data ORDER BY id").fetchall():
+            try:
+                reading = json.loads(data)
+                reading['timestamp'] = timestamp
+                reading.setdefault('coordinator', None)
+                reading.setdefault('seq', None)
+                rows.append(self.spool_row(reading, time.time()))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Eski kayıt taşınamadı: %s - Veri: %s", e, data)
+
+        cursor.executemany(SPOOL_INSERT_SQL, rows)
+        cursor.execute("DROP TABLE offline_data")
+        self.conn.commit()
+        logger.info("Eski yerel veritabanından %d kayıt taşındı", len(rows))
+
+    def init_sequence(self):
+        """
+        Ağ geçidi kimliğini yükle (yoksa üret) ve sıra numarası sayacını başlat.
+        Veritabanında yalnızca ayrılan bloğun sonu tutulur; yeniden başlatmada sayaç
+        bu değerden devam eder, kullanılmadan kalan numaralar atlanır ama tekrar kullanılmaz.
+        """
+        cursor = self.conn.cursor()
+        state = dict(cursor.execute("SELECT key, value FROM gateway_state").fetchall())
+        self.gateway_id = GATEWAY_ID or state.get('gateway_id') or uuid.uuid4().hex
+        self.next_seq = int(state.get('seq_reserved', 0))
+        self.seq_reserved_until = self.next_seq
+        self.seq_lock = threading.Lock()
+        cursor.execute(
+            "INSERT OR REPLACE INTO gateway_state (key, value) VALUES ('gateway_id', ?)",
+            (self.gateway_id,)
+        )
+        self.conn.commit()
+        logger.info("Ağ geçidi kimliği: %s (sıra numarası %d)", self.gateway_id, self.next_seq)
+
+    def next_sequence(self, count=1, db_locked=False):
+        """
+        Kayda verilecek sıra numarası (count > 1 ise ardışık numaraların ilki).
+        Blok yetmiyorsa yeni blok ayrılır; db_locked, çağıranın db_lock'u tuttuğunu belirtir.
+        """
+        with self.seq_lock:
+            if self.next_seq + count <= self.seq_reserved_until:
+                seq = self.next_seq
+                self.next_seq += count
+                return seq
+        # Kilit sırası her zaman db_lock -> seq_lock (bütçe kontrolü db_lock tutarken çağırır)
+        if db_locked:
+            return self.reserve_sequence_block(count)
+        with self.db_lock:
+            return self.reserve_sequence_block(count)
+
+    def reserve_sequence_block(self, count):
+        """Yeni sıra numarası bloğunu kaydet ve numaraları ver (db_lock tutulurken)"""
+        with self.seq_lock:
+            seq = self.next_seq
+            if seq + count > self.seq_reserved_until:
+                self.seq_reserved_until = seq + max(count, SEQ_RESERVE_BLOCK)
+                try:
+                    # Blok kullanılmadan önce diske yazılmalı: NORMAL modda commit elektrik
+                    # kesintisinde geri alınabilir, sayaç yeniden başlatmada gönderilmiş
+                    # numaraları tekrar verir ve sunucu yeni kayıtları tekrar sanıp atar.
+                    self.commit_spool()
+                    self.conn.execute("PRAGMA synchronous=FULL")
+                    try:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO gateway_state (key, value) VALUES ('seq_reserved', ?)",
+                            (str(self.seq_reserved_until),)
+                        )
+                        self.conn.commit()
+                    finally:
+                        self.conn.execute(f"PRAGMA synchronous={SPOOL_SYNCHRONOUS}")
+                except sqlite3.Error as e:
+                    logger.error("Sıra numarası bloğu kaydedilemedi: %s", e)
+            self.next_seq = seq + count
+            return seq
+
+    def spool_row(self, reading, created_at):
+        """Kayıt sözlüğünü yerel veritabanı satırına çevir"""
+        return tuple(reading[field] for field in READING_FIELDS) + (created_at,)
+
     def get_timestamp(self):
         """ISO formatında zaman damgası döndür"""
         return datetime.now().isoformat()
         
-    def send_error_to_server(self, error_type, error_message):
-        """Hata mesajını sunucuya gönder"""
-        payload = {
-            'error_type': error_type,
-            'error_message': error_message,
-            'timestamp': self.get_timestamp()
-        }
-        
-        try:
-            response = requests.post(
-                ERROR_URL,
-                json=payload,
-                timeout=3
-            )
-            
-            if response.status_code == 200:
-                print(f"Hata mesajı sunucuya gönderildi: {error_type}")
-                return True
-            else:
-                print(f"Hata mesajı gönderilemedi: {response.status_code}")
-                return False
-                
-        except requests.exceptions.RequestException as e:
-            print(f"Hata mesajı gönderme başarısız: {e}")
-            return False
-    
     def check_and_report_errors(self):
         """
         Hataları kontrol et ve 10 dakikada bir sunucuya bildir
         """
         current_time = time.time()
         
-        # Seri port hata kontrolü
-        if not self.serial_connected:
-            # Son hata mesajından 10 dakika geçtiyse tekrar gönder
-            if current_time - self.last_serial_error_time >= ERROR_REPORT_INTERVAL:
-                print(f"HATA: Seri port bağlı değil - Sunucuya bildiriliyor")
-                self.send_error_to_server(
-                    'serial_port_error',
-                    'Seri port bağlantısı kurulamadı veya kesildi'
-                )
-                self.last_serial_error_time = current_time
-        
-        # Veri timeout kontrolü (sadece seri port bağlıyken)
-        if self.serial_connected and self.last_data_time is not None:
-            time_since_last_data = current_time - self.last_data_time
-            
-            # 10 dakikadan fazla veri gelmemişse
-            if time_since_last_data > DATA_TIMEOUT:
+        for reader in self.readers:
+            # Seri port hata kontrolü
+            if not reader.connected:
                 # Son hata mesajından 10 dakika geçtiyse tekrar gönder
-                if current_time - self.last_data_timeout_error_time >= ERROR_REPORT_INTERVAL:
-                    print(f"HATA: {int(time_since_last_data)} saniyedir veri gelmiyor - Sunucuya bildiriliyor")
-                    self.send_error_to_server(
-                        'data_timeout',
-                        f'{int(time_since_last_data)} saniyedir veri gelmedi'
-                    )
-                    self.last_data_timeout_error_time = current_time
-        
-    def parse_sensor_data(self, data_str):
-        """Sensör verisini parse et ve JSON formatına çevir"""
-        try:
-            # Regex pattern ile veriyi parse et
-            # Node 17277: Light=14.69, Temp=29.71, Humid_air=54.27, Humid_ground=100%, RX_drift=6, TX_drift=0
-            pattern = r'Node\s+(\d+):\s+Light=([0-9.]+),\s+Temp=([0-9.]+),\s+Humid_air=([0-9.]+),\s+Humid_ground=([0-9]+)%,\s+RX_drift=([0-9-]+),\s+TX_drift=([0-9-]+)'
-            
-            match = re.match(pattern, data_str.strip())
+                if current_time - reader.last_serial_error_time >= ERROR_REPORT_INTERVAL:
+                    logger.error("Seri port bağlı değil (%s) - Sunucuya bildiriliyor", reader.port)
+                    reader.report_serial_error('Seri port bağlantısı kurulamadı veya kesildi')
             
-            if match:
-                node_id = int(match.group(1))
-                light = float(match.group(2))
-                temp = float(match.group(3))
-                humid_air = float(match.group(4))
-                humid_ground = int(match.group(5))
-                rx_drift = int(match.group(6))
-                tx_drift = int(match.group(7))
-                
-                # JSON formatında veri oluştur
-                parsed_data = {
-                    "node_id": node_id,
-                    "light": light,
-                    "temperature": temp,
-                    "humidity_air": humid_air,
-                    "humidity_ground": humid_ground,
-                    "rx_drift": rx_drift,
-                    "tx_drift": tx_drift,
-                    "timestamp": self.get_timestamp()
-                }
-                
-                print(f"Veri parse edildi - Node ID: {node_id}")
-                return json.dumps(parsed_data)
-            else:
-                print(f"Veri formatı eşleşmedi: {data_str}")
-                return None
+            # Veri timeout kontrolü (sadece seri port bağlıyken)
+            elif reader.last_data_time is not None:
+                time_since_last_data = current_time - reader.last_data_time
                 
-        except Exception as e:
-            print(f"Veri parse hatası: {e} - Veri: {data_str}")
-            return None
+                # 10 dakikadan fazla veri gelmemişse
+                if time_since_last_data > DATA_TIMEOUT:
+                    # Son hata mesajından 10 dakika geçtiyse tekrar gönder
+                    if current_time - reader.last_data_timeout_error_time >= ERROR_REPORT_INTERVAL:
+                        logger.error("%s üzerinden %d saniyedir veri gelmiyor - Sunucuya bildiriliyor",
+                                     reader.port, time_since_last_data)
+                        self.report_error(
+                            'data_timeout',
+                            f'{reader.port}: {int(time_since_last_data)} saniyedir veri gelmedi'
+                        )
+                        reader.last_data_timeout_error_time = current_time
         
-    def save_to_database(self, data, timestamp):
+    def check_node_liveness(self):
+        """Zaman aşımına uğrayan düğümleri bul, aynı anda düşenleri tek hata mesajında bildir"""
+        if self.liveness is None:
+            return
+        expired = self.liveness.expired()
+        if not expired:
+            return
+        self.metrics.incr('node_timeouts', len(expired))
+        nodes = ', '.join(f'{node_id} ({int(silent)} sn)' for node_id, silent in expired)
+        logger.error("%d düğümden veri gelmiyor: %s - Sunucuya bildiriliyor", len(expired), nodes)
+        self.report_error(
+            'node_timeout',
+            f'{len(expired)} düğümden {NODE_TIMEOUT} saniyedir veri gelmedi: {nodes}'
+        )
+
+    def process_line(self, line, coordinator=None, parser=None):
+        """Seri porttan gelen tek satırı işle (okuyucu thread'lerinden, portun ayrıştırıcısıyla çağrılır)"""
+        # Veriyi parse et
+        started = time.perf_counter()
+        records = (parser or self.parser).parse(line)
+        self.metrics.observe('parse', time.perf_counter() - started)
+
+        if records is None:
+            # Parse edilemeyen veriler için bilgi ver
+            self.metrics.incr('parse_failures')
+            logger.warning("Parse edilemeyen veri atlandı: %s", line)
+            return False
+
+        self.metrics.incr('lines_parsed')
+        logger.debug("İşlenen veri: %s", line)
+        self.process_records(records, coordinator)
+        return True
+
+    def process_frame(self, frame, coordinator=None, parser=None):
+        """Seri porttan gelen tek ikili çerçeveyi işle"""
+        started = time.perf_counter()
+        records = (parser or self.parser).parse_frame(frame)
+        self.metrics.observe('parse', time.perf_counter() - started)
+
+        if records is None:
+            # Bozuk çerçeve (CRC / uzunluk hatası veya senkron kaybı sonrası yarım çerçeve)
+            self.metrics.incr('frame_errors')
+            logger.warning("Bozuk ikili çerçeve atlandı: %s", frame.hex())
+            return False
+
+        self.metrics.incr('frames_parsed')
+        self.process_records(records, coordinator)
+        return True
+
+    def process_records(self, records, coordinator):
+        """Ayrıştırılan kayıtları zaman damgası ve koordinatörle etiketleyip yükleme hattına ver"""
+        if records:
+            timestamp = self.get_timestamp()
+        for kind, record in records:
+            record['timestamp'] = timestamp
+            record['coordinator'] = coordinator
+            node_id = record['node_id']
+            logger.debug("Veri parse edildi - %s, Node ID: %s", kind, node_id)
+            if self.liveness is not None and node_id is not None and self.liveness.touch(node_id):
+                logger.info("Düğümden yeniden veri geliyor - Node ID: %s", node_id)
+
+            if kind != 'reading':
+                self.enqueue_record(kind, record)
+            # Yükleme kuyruğuna ekle (toplama açıksa yalnızca kapanan pencerelerin özeti).
+            # Ölü bant yalnızca ham okumalara uygulanır, pencere istatistiklerini bozmaz.
+            elif self.aggregator is not None:
+                with self.filter_lock:
+                    summaries = self.aggregator.add(record)
+                self.enqueue_summaries(summaries)
+            elif self.deadband is None or self.accept_deadband(record):
+                self.enqueue_reading(record)
+            else:
+                self.metrics.incr('deadband_suppressed')
+                logger.debug("Değişmeyen veri atlandı - Node ID: %s", node_id)
+
+    def accept_deadband(self, reading):
+        """Ölü bant filtresini okuyucu thread'leri arasında kilitle uygula"""
+        with self.filter_lock:
+            return self.deadband.accept(reading)
+
+    def save_to_database(self, reading):
         """Veriyi yerel veritabanına kaydet"""
+        self.save_batch_to_database([reading])
+
+    def save_batch_to_database(self, readings, summaries=(), records=()):
+        """
+        Kayıtları, pencere özetlerini ve diğer kayıt türlerini ((tür, kayıt) çiftleri)
+        yerel veritabanına ekle. Commit hemen yapılmaz,
+        SPOOL_COMMIT_INTERVAL / SPOOL_COMMIT_MAX_ROWS dolunca toplu yapılır.
+        """
+        now = time.time()
+        started = time.perf_counter()
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                "INSERT INTO offline_data (data, timestamp) VALUES (?, ?)",
-                (data, timestamp)
-            )
-            self.conn.commit()
-            print(f"Veri yerel veritabanına kaydedildi")
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                if readings:
+                    cursor.executemany(
+                        SPOOL_INSERT_SQL,
+                        [self.spool_row(reading, now) for reading in readings]
+                    )
+                    self.pending_count += len(readings)
+                if summaries:
+                    cursor.executemany(
+                        SUMMARY_INSERT_SQL,
+                        [tuple(summary[field] for field in SUMMARY_FIELDS) + (now,) for summary in summaries]
+                    )
+                    self.pending_summary_count += len(summaries)
+                if records:
+                    cursor.executemany(
+                        RECORD_INSERT_SQL,
+                        [(kind, json.dumps(record), now, record['seq']) for kind, record in records]
+                    )
+                    self.pending_record_count += len(records)
+                if self.first_uncommitted_at is None:
+                    self.first_uncommitted_at = now
+                self.uncommitted_rows += len(readings) + len(summaries) + len(records)
+                if self.uncommitted_rows >= SPOOL_COMMIT_MAX_ROWS:
+                    self.commit_spool()
+            self.metrics.observe('spool_write', time.perf_counter() - started)
+            self.metrics.incr('spooled_rows', len(readings) + len(summaries) + len(records))
+            logger.debug("%d kayıt yerel veritabanına kaydedildi", len(readings) + len(summaries) + len(records))
         except sqlite3.Error as e:
-            print(f"Veritabanı kayıt hatası: {e}")
-            
-    def send_to_server(self, data, timestamp):
-        """Veriyi sunucuya gönder"""
-        # data zaten JSON string, önce parse et
+            logger.error("Veritabanı kayıt hatası: %s", e)
+
+    def commit_spool(self):
+        """Bekleyen yerel kayıtları commit et (db_lock tutulurken çağrılır)"""
+        self.conn.commit()
+        self.uncommitted_rows = 0
+        self.first_uncommitted_at = None
+
+    def flush_spool(self, force=False):
+        """Grup commit süresi dolduysa (veya force) yerel kayıtları diske yaz"""
+        if self.first_uncommitted_at is None:
+            return
+        if not force and time.time() - self.first_uncommitted_at < SPOOL_COMMIT_INTERVAL:
+            return
         try:
-            parsed_data = json.loads(data)
-        except json.JSONDecodeError:
-            print(f"JSON parse hatası: {data}")
-            return False
-        
-        # Sunucunun beklediği format
+            with self.db_lock:
+                self.commit_spool()
+        except sqlite3.Error as e:
+            logger.error("Veritabanı commit hatası: %s", e)
+
+    def send_batch_to_server(self, records, summaries=(), errors=(), typed_records=()):
+        """
+        Kayıt listesini (ve pencere özetlerini, hata kayıtlarını, diğer kayıt türlerini)
+        tek istekte v2 formatında (sütun listesi + satırlar, gzip) sunucuya gönder.
+        Gövde UPLOAD_MAX_BYTES'ı aşarsa ikiye bölünüp ayrı isteklerle gönderilir.
+        Yeniden denenmeyecek 4xx yanıtında gövde karantinaya alınır ve True döner:
+        çağıran kayıtları yerel veritabanından silebilir, sıranın başını tıkamazlar.
+        False yalnızca yeniden denenecek hatalarda (5xx, zaman aşımı, bağlantı) döner.
+        """
         payload = {
-            'data': data,  # JSON string olarak gönder
-            'timestamp': timestamp
+            'v': 2,
+            'gateway_id': self.gateway_id,
+            'fields': UPLOAD_READING_FIELDS,
+            'rows': [[reading[field] for field in READING_FIELDS] + [reading.get('sample_count', 1)]
+                     for reading in records]
         }
-        
+        if summaries:
+            payload['summary_fields'] = SUMMARY_FIELDS
+            payload['summary_rows'] = [[summary[field] for field in SUMMARY_FIELDS] for summary in summaries]
+        if errors:
+            payload['error_fields'] = ERROR_FIELDS
+            payload['error_rows'] = [[error[field] for field in ERROR_FIELDS] for error in errors]
+        if typed_records:
+            # Her kayıt türü kendi sütun listesiyle: {'drift': {'fields': [...], 'rows': [...]}, ...}
+            payload['records'] = {}
+            for kind, record in typed_records:
+                fields = RECORD_FIELDS[kind]
+                group = payload['records'].setdefault(kind, {'fields': fields, 'rows': []})
+                group['rows'].append([record[field] for field in fields])
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        if len(body) > UPLOAD_MAX_BYTES:
+            sections = [list(records), list(summaries), list(errors), list(typed_records)]
+            half = sum(len(section) for section in sections) // 2
+            if half > 0:
+                first, second = [], []
+                for section in sections:
+                    take = min(len(section), half)
+                    first.append(section[:take])
+                    second.append(section[take:])
+                    half -= take
+                return self.send_batch_to_server(*first) and self.send_batch_to_server(*second)
+        payload_text = body
+        headers = {'Content-Type': 'application/json'}
+        if UPLOAD_GZIP_LEVEL:
+            body = gzip.compress(body, compresslevel=UPLOAD_GZIP_LEVEL)
+            headers['Content-Encoding'] = 'gzip'
+
+        started = time.perf_counter()
         try:
-            response = requests.post(
-                TARGET_URL,
-                json=payload,
-                timeout=3
+            response = self.session.post(
+                V2_URL,
+                data=body,
+                headers=headers,
+                timeout=5
             )
-            
+            self.metrics.observe('upload', time.perf_counter() - started)
+
             if response.status_code == 200:
-                print(f"Veri başarıyla gönderildi: {response.status_code}")
+                self.breaker.record_success()
+                self.metrics.incr('uploads_ok')
+                self.metrics.incr('uploaded_rows', len(records) + len(summaries) + len(typed_records))
+                self.metrics.incr('uploaded_errors', len(errors))
+                self.metrics.incr('upload_bytes', len(body))
+                logger.debug(
+                    "%d kayıt, %d hata toplu olarak gönderildi",
+                    len(records) + len(summaries) + len(typed_records), len(errors)
+                )
                 return True
-            else:
-                print(f"Sunucu hatası: {response.status_code} - {response.text}")
+            elif response.status_code >= 500 or response.status_code in UPLOAD_RETRY_STATUSES:
+                # 5xx sunucunun sorunlu olduğunu gösterir, gönderim daha sonra tekrar denenir
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                self.metrics.incr('uploads_failed')
+                logger.error("Sunucu hatası: %s - %s", response.status_code, response.text)
                 return False
-                
+            else:
+                # 4xx: aynı gövde her denemede reddedilir, karantinaya alınır
+                self.quarantine_upload(response.status_code, response.text, payload_text)
+                return True
+
         except requests.exceptions.RequestException as e:
-            print(f"HTTP isteği başarısız: {e}")
+            self.metrics.observe('upload', time.perf_counter() - started)
+            self.breaker.record_failure()
+            self.metrics.incr('uploads_failed')
+            logger.warning("Toplu HTTP isteği başarısız: %s", e)
             return False
-            
-    def send_offline_data(self):
-        """Yerel veritabanındaki verileri sunucuya gönder"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, data, timestamp FROM offline_data ORDER BY id")
-        offline_records = cursor.fetchall()
-        
-        if not offline_records:
+
+    def quarantine_upload(self, status, response_text, payload_text):
+        """Sunucunun reddettiği gövdeyi rejected_uploads tablosuna yaz ve hata olarak bildir"""
+        self.metrics.incr('uploads_rejected')
+        logger.error("Gönderim reddedildi, karantinaya alındı: %s - %s", status, response_text)
+        try:
+            with self.db_lock:
+                self.conn.execute(
+                    "INSERT INTO rejected_uploads (status, response, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (status, response_text[:1000], payload_text.decode(), time.time())
+                )
+                self.commit_spool()
+        except sqlite3.Error as e:
+            logger.error("Reddedilen gönderim kaydedilemedi: %s", e)
+        self.report_error('upload_rejected', f'HTTP {status}: {response_text[:200]}')
+
+    def add_to_batch(self, reading):
+        """Canlı veriyi gönderim kuyruğuna ekle, kuyruk dolduysa gönder"""
+        if not self.pending_batch and not self.pending_summaries and not self.pending_records:
+            self.batch_started_at = time.time()
+        self.pending_batch.append(reading)
+
+        if len(self.pending_batch) >= BATCH_MAX_SIZE:
+            self.flush_batch()
+
+    def add_summary_to_batch(self, summary):
+        """Pencere özetini gönderim kuyruğuna ekle, kuyruk dolduysa gönder"""
+        if not self.pending_batch and not self.pending_summaries and not self.pending_records:
+            self.batch_started_at = time.time()
+        self.pending_summaries.append(summary)
+
+        if len(self.pending_summaries) >= BATCH_MAX_SIZE:
+            self.flush_batch()
+
+    def add_record_to_batch(self, kind, record):
+        """Diğer kayıt türlerini gönderim kuyruğuna ekle, kuyruk dolduysa gönder"""
+        if not self.pending_batch and not self.pending_summaries and not self.pending_records:
+            self.batch_started_at = time.time()
+        self.pending_records.append((kind, record))
+
+        if len(self.pending_records) >= BATCH_MAX_SIZE:
+            self.flush_batch()
+
+    def flush_batch(self):
+        """
+        Bekleyen canlı verileri ve özetleri boyut veya süre sınırı dolduysa gönder.
+        Penceresi dolan hata kayıtları bir sonraki gönderime eklenir; veri beklemiyorsa tek başına gönderilir.
+        """
+        for error in self.errors.due():
+            if error['seq'] is None:
+                error['seq'] = self.next_sequence()
+            self.pending_errors.append(error)
+        if (not self.pending_batch and not self.pending_summaries and
+                not self.pending_records and not self.pending_errors):
             return
-            
-        print(f"Yerel veritabanında {len(offline_records)} kayıt bulundu, gönderiliyor...")
-        
-        successful_ids = []
-        
-        for record_id, data, timestamp in offline_records:
-            if self.send_to_server(data, timestamp):
-                successful_ids.append(record_id)
-            else:
+        if (not self.pending_errors and
+                len(self.pending_batch) < BATCH_MAX_SIZE and
+                len(self.pending_summaries) < BATCH_MAX_SIZE and
+                len(self.pending_records) < BATCH_MAX_SIZE and
+                time.time() - self.batch_started_at < BATCH_MAX_WAIT):
+            return
+
+        records, summaries, errors = self.pending_batch, self.pending_summaries, self.pending_errors
+        typed_records = self.pending_records
+        self.pending_batch, self.pending_summaries, self.pending_errors = [], [], []
+        self.pending_records = []
+
+        # Devre açıksa zaman aşımı beklemeden doğrudan yerel veritabanına yaz.
+        # Hata kayıtları bellekte birleştirilmeye devam eder, sunucu dönünce gönderilir.
+        if not self.server_available():
+            self.save_batch_to_database(records, summaries, typed_records)
+            self.errors.restore(errors)
+            return
+
+        if self.send_batch_to_server(records, summaries, errors, typed_records):
+            # Başarılı gönderim sonrası offline verileri kontrol et
+            self.send_offline_data()
+        else:
+            # Başarısız gönderim, yerel veritabanına kaydet
+            self.save_batch_to_database(records, summaries, typed_records)
+            self.errors.restore(errors)
+
+    def send_offline_data(self):
+        """
+        Yerel veritabanındaki verileri id sırasıyla sabit boyutlu parçalar halinde gönder.
+        Her parça son gönderilen id'den (watermark) başlar, tablo baştan taranmaz.
+        """
+        total_sent = 0
+
+        while self.pending_count > 0 and not self.stop_event.is_set():
+            started = time.perf_counter()
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                cursor.execute(
+                    f"SELECT id, {', '.join(UPLOAD_READING_FIELDS)} FROM offline_readings "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (self.drain_watermark, BATCH_MAX_SIZE)
+                )
+                offline_records = cursor.fetchall()
+
+            if not offline_records:
+                # Sayaç veritabanıyla uyuşmuyorsa düzelt
+                self.pending_count = 0
+                break
+
+            if total_sent == 0:
+                logger.info("Yerel veritabanında kayıt bulundu, gönderiliyor...")
+
+            records = [dict(zip(UPLOAD_READING_FIELDS, row[1:])) for row in offline_records]
+            if not self.breaker.allow_request() or not self.send_batch_to_server(records):
                 # İlk başarısız gönderimde dur
                 break
-                
-        # Başarıyla gönderilen kayıtları sil
-        if successful_ids:
-            placeholders = ','.join('?' * len(successful_ids))
-            cursor.execute(f"DELETE FROM offline_data WHERE id IN ({placeholders})", successful_ids)
-            self.conn.commit()
-            print(f"Yerel veritabanından {len(successful_ids)} kayıt silindi")
-            
-    def check_connection(self):
-        """Sunucu bağlantısını kontrol et"""
+
+            # Başarıyla gönderilen parçayı sil (id sıralı olduğu için aralık yeterli)
+            last_id = offline_records[-1][0]
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                cursor.execute(
+                    "DELETE FROM offline_readings WHERE id > ? AND id <= ?",
+                    (self.drain_watermark, last_id)
+                )
+                self.commit_spool()
+                self.pending_count = max(0, self.pending_count - cursor.rowcount)
+            self.drain_watermark = last_id
+            total_sent += len(offline_records)
+            self.metrics.observe('drain', time.perf_counter() - started)
+            self.metrics.incr('drained_rows', len(offline_records))
+
+        if total_sent:
+            logger.info("Yerel veritabanından %d kayıt gönderildi ve silindi", total_sent)
+
+        self.send_offline_summaries()
+        self.send_offline_records()
+
+    def send_offline_summaries(self):
+        """Yerel veritabanındaki pencere özetlerini parçalar halinde gönder"""
+        while self.pending_summary_count > 0 and not self.stop_event.is_set():
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                cursor.execute(
+                    f"SELECT id, {', '.join(SUMMARY_FIELDS)} FROM offline_summaries ORDER BY id LIMIT ?",
+                    (BATCH_MAX_SIZE,)
+                )
+                offline_summaries = cursor.fetchall()
+
+            if not offline_summaries:
+                self.pending_summary_count = 0
+                break
+
+            summaries = [dict(zip(SUMMARY_FIELDS, row[1:])) for row in offline_summaries]
+            if not self.breaker.allow_request() or not self.send_batch_to_server([], summaries):
+                break
+
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                cursor.execute("DELETE FROM offline_summaries WHERE id <= ?", (offline_summaries[-1][0],))
+                self.commit_spool()
+                self.pending_summary_count = max(0, self.pending_summary_count - cursor.rowcount)
+
+    def send_offline_records(self):
+        """Yerel veritabanındaki diğer kayıt türlerini parçalar halinde gönder"""
+        while self.pending_record_count > 0 and not self.stop_event.is_set():
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT id, kind, data FROM offline_records ORDER BY id LIMIT ?", (BATCH_MAX_SIZE,))
+                offline_records = cursor.fetchall()
+
+            if not offline_records:
+                self.pending_record_count = 0
+                break
+
+            typed_records = [(kind, json.loads(data)) for _, kind, data in offline_records]
+            if not self.breaker.allow_request() or not self.send_batch_to_server([], typed_records=typed_records):
+                break
+
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                cursor.execute("DELETE FROM offline_records WHERE id <= ?", (offline_records[-1][0],))
+                self.commit_spool()
+                self.pending_record_count = max(0, self.pending_record_count - cursor.rowcount)
+
+    def spool_bytes(self, cursor):
+        """Kayıtların veritabanında kapladığı yer (silinip boşalan sayfalar sayılmaz)"""
+        page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def spool_over_budget(self, cursor):
+        """
+        Yerel veritabanı kayıt sayısı veya boyut bütçesini aşıyor mu?
+        Diskteki boş yere değil veritabanının kendi boyutuna bakılır: kayıt silmek
+        diğer dosyaların kapladığı yeri geri vermez, yalnızca bu bütçeyi düşürür.
+        """
+        return self.pending_count > SPOOL_MAX_ROWS or self.spool_bytes(cursor) > SPOOL_MAX_BYTES
+
+    def enforce_spool_budget(self):
+        """
+        Yerel veritabanını bütçe içinde tut:
+        1. SPOOL_MAX_AGE'den eski kayıtları sil
+        2. Bütçe aşıldığı sürece en eski kaydı tutan tablodan (SPOOL_EVICTION_TABLES) yer aç:
+           okumalar önce düğüm başına SPOOL_DOWNSAMPLE_BUCKET aralıklarında ortalamaya
+           indirilir (önce en eski kısım, sonra tümü), diğer tablolardan en eski kayıtlar silinir
+        """
+        current_time = time.time()
+        if current_time - self.last_budget_check_time < SPOOL_CHECK_INTERVAL:
+            return
+        self.last_budget_check_time = current_time
+        if self.pending_count == 0 and self.pending_summary_count == 0 and self.pending_record_count == 0:
+            return
+
         try:
-            response = requests.get(
-                TARGET_URL.replace('/data', '/ping'),  # Ping endpoint'i varsa
-                timeout=2
-            )
-            return True
-        except:
-            # Ping endpoint'i yoksa normal endpoint'i dene
-            try:
-                response = requests.post(
-                    TARGET_URL,
-                    json={'test': 'connection'},
-                    timeout=2
+            with self.db_lock:
+                cursor = self.conn.cursor()
+                cursor.execute(
+                    "DELETE FROM offline_readings WHERE created_at < ?",
+                    (current_time - SPOOL_MAX_AGE,)
                 )
-                return True
-            except:
+                if cursor.rowcount > 0:
+                    self.pending_count -= cursor.rowcount
+                    logger.warning("Yerel veritabanından %d eski kayıt silindi", cursor.rowcount)
+                cursor.execute(
+                    "DELETE FROM offline_summaries WHERE created_at < ?",
+                    (current_time - SPOOL_MAX_AGE,)
+                )
+                self.pending_summary_count -= cursor.rowcount
+                cursor.execute(
+                    "DELETE FROM offline_records WHERE created_at < ?",
+                    (current_time - SPOOL_MAX_AGE,)
+                )
+                self.pending_record_count -= cursor.rowcount
+                cursor.execute(
+                    "DELETE FROM rejected_uploads WHERE created_at < ?",
+                    (current_time - SPOOL_MAX_AGE,)
+                )
+
+                # Yer, en eski veriyi tutan tablodan açılır; okumalar silinmeden önce seyreltilir
+                downsample_fractions = [SPOOL_DOWNSAMPLE_FRACTION, 1.0]
+                while self.spool_over_budget(cursor):
+                    table = self.oldest_spool_table(cursor)
+                    if table is None:
+                        break
+                    if table == 'offline_readings' and downsample_fractions:
+                        self.downsample_spool(cursor, downsample_fractions.pop(0))
+                    elif not self.evict_oldest(cursor, table):
+                        break
+
+                if self.spool_over_budget(cursor):
+                    # Silinecek kayıt kalmadı: bir sonraki kontrolde yeniden denenir
+                    logger.error(
+                        "Yerel veritabanı bütçe içine indirilemedi: %d bayt (sınır %d), %d bekleyen kayıt",
+                        self.spool_bytes(cursor), SPOOL_MAX_BYTES, self.pending_count
+                    )
+
+                self.commit_spool()
+                # Boşalan sayfalar dosyadan, yazılmış WAL da diskten geri verilir
+                # (incremental_vacuum her adımda tek sayfa boşaltır, executescript sonuna kadar çalıştırır)
+                self.conn.executescript("PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);")
+        except sqlite3.Error as e:
+            logger.error("Yerel veritabanı bütçe kontrolü hatası: %s", e)
+
+    def oldest_spool_table(self, cursor):
+        """
+        Bütçe aşıldığında yerin açılacağı tablo: kayıt sayısı sınırı aşıldıysa okumalar,
+        değilse en eski kaydı (created_at) tutan tablo. Bekleyen kayıt yoksa None (db_lock tutulurken).
+        """
+        if self.pending_count > SPOOL_MAX_ROWS:
+            return 'offline_readings'
+        oldest = None
+        for table, counter in SPOOL_EVICTION_TABLES.items():
+            if getattr(self, counter) <= 0:
+                continue
+            row = cursor.execute(f"SELECT created_at FROM {table} ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                setattr(self, counter, 0)  # Sayaç veritabanıyla uyuşmuyorsa düzelt
+            elif oldest is None or row[0] < oldest[0]:
+                oldest = (row[0], table)
+        return oldest[1] if oldest else None
+
+    def evict_oldest(self, cursor, table):
+        """Tablonun en eski kayıtlarının onda birini (en az bir) sil, silinen sayıyı döndür (db_lock tutulurken)"""
+        counter = SPOOL_EVICTION_TABLES[table]
+        pending = getattr(self, counter)
+        limit = max(pending // 10, 1)
+        if table == 'offline_readings':
+            limit = max(pending - SPOOL_MAX_ROWS, limit)
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} ORDER BY id LIMIT ?)",
+            (limit,)
+        )
+        setattr(self, counter, max(0, pending - cursor.rowcount))
+        logger.warning("Yerel veritabanı bütçesi aşıldı, %s tablosundan en eski %d kayıt silindi",
+                       table, cursor.rowcount)
+        return cursor.rowcount
+
+    def downsample_spool(self, cursor, fraction):
+        """En eski kayıtların verilen oranını düğüm ve zaman aralığına göre ağırlıklı ortalamaya indir (db_lock tutulurken)"""
+        cursor.execute(
+            "SELECT id FROM offline_readings ORDER BY id LIMIT 1 OFFSET ?",
+            (max(int(self.pending_count * fraction) - 1, 0),)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return
+        cutoff_id = row[0]
+
+        # Daha önce seyreltilmiş kayıtlar sample_count ile ağırlıklandırılır.
+        # Özet kayıt grubun en küçük id'sini alır, gönderim sırası bozulmaz.
+        cursor.execute('''
+            SELECT COUNT(*), MIN(id), node_id,
+                   SUM(light * sample_count) / SUM(sample_count),
+                   SUM(temperature * sample_count) / SUM(sample_count),
+                   SUM(humidity_air * sample_count) / SUM(sample_count),
+                   CAST(ROUND(SUM(humidity_ground * sample_count) * 1.0 / SUM(sample_count)) AS INTEGER),
+                   CAST(ROUND(SUM(rx_drift * sample_count) * 1.0 / SUM(sample_count)) AS INTEGER),
+                   CAST(ROUND(SUM(tx_drift * sample_count) * 1.0 / SUM(sample_count)) AS INTEGER),
+                   MIN(timestamp), coordinator, MIN(seq), MIN(created_at), SUM(sample_count)
+            FROM offline_readings
+            WHERE id <= ?
+            GROUP BY node_id, coordinator, CAST(created_at / ? AS INTEGER)
+        ''', (cutoff_id, SPOOL_DOWNSAMPLE_BUCKET))
+        groups = cursor.fetchall()
+
+        # Birden fazla okumadan oluşan özet yeni bir kayıttır, yeni sıra numarası alır: grubun
+        # bir okuması sunucuya ulaşmışsa eski numarayla özet tekrar sayılıp atılırdı.
+        # Tek okumalı grup değişmez, numarasını korur.
+        merged = sum(1 for group in groups if group[0] > 1)
+        seq = self.next_sequence(merged, db_locked=True) if merged else None
+        summaries = []
+        for group in groups:
+            row = list(group[1:])
+            if group[0] > 1:
+                row[10] = seq
+                seq += 1
+            summaries.append(row)
+
+        cursor.execute("DELETE FROM offline_readings WHERE id <= ?", (cutoff_id,))
+        removed = cursor.rowcount
+        cursor.executemany(
+            f"INSERT INTO offline_readings (id, {', '.join(READING_FIELDS)}, created_at, sample_count) "
+            f"VALUES ({', '.join('?' * (len(READING_FIELDS) + 3))})",
+            summaries
+        )
+        self.pending_count += len(summaries) - removed
+        logger.warning("Yerel veritabanı seyreltildi: %d kayıt %d özet kayda indirildi", removed, len(summaries))
+
+    def enqueue_reading(self, reading):
+        """Veriyi yükleme kuyruğuna ekle, kuyruk doluysa yerel veritabanına yaz"""
+        reading['seq'] = self.next_sequence()
+        try:
+            self.upload_queue.put_nowait(('data', reading))
+        except queue.Full:
+            # Yavaş ağ seri okumayı bekletmesin
+            self.metrics.incr('queue_overflow')
+            self.save_to_database(reading)
+
+    def enqueue_summaries(self, summaries):
+        """Pencere özetlerini yükleme kuyruğuna ekle, kuyruk doluysa yerel veritabanına yaz"""
+        overflow = []
+        for summary in summaries:
+            summary['seq'] = self.next_sequence()
+            try:
+                self.upload_queue.put_nowait(('summary', summary))
+            except queue.Full:
+                self.metrics.incr('queue_overflow')
+                overflow.append(summary)
+        if overflow:
+            self.save_batch_to_database([], overflow)
+
+    def enqueue_record(self, kind, record):
+        """Diğer kayıt türlerini yükleme kuyruğuna ekle, kuyruk doluysa yerel veritabanına yaz"""
+        record['seq'] = self.next_sequence()
+        try:
+            self.upload_queue.put_nowait(('record', kind, record))
+        except queue.Full:
+            self.metrics.incr('queue_overflow')
+            self.save_batch_to_database([], (), [(kind, record)])
+
+    def report_error(self, error_type, error_message):
+        """Hata olayını birleştiriciye bırak, seri okumayı bekletme (yükleyici toplu gönderir)"""
+        self.metrics.incr('errors_reported')
+        self.errors.add(error_type, error_message, self.get_timestamp())
+
+    def upload_worker(self):
+        """Kuyruktaki verileri ve hata mesajlarını sunucuya gönder (ayrı thread)"""
+        self.startup_sync()
+
+        while not self.stop_event.is_set():
+            try:
+                item = self.upload_queue.get(timeout=0.2)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                if item[0] == 'data':
+                    self.add_to_batch(item[1])
+                elif item[0] == 'summary':
+                    self.add_summary_to_batch(item[1])
+                elif item[0] == 'record':
+                    self.add_record_to_batch(item[1], item[2])
+
+            # Devre açıkken trafik olmasa da sunucu periyodik olarak yoklanır
+            if self.breaker.state != CircuitBreaker.CLOSED:
+                self.server_available()
+
+            # Süresi dolan toplu gönderimi ve yerel commit'i yap
+            self.flush_batch()
+            self.flush_spool()
+            self.enforce_spool_budget()
+            self.write_metrics_snapshot()
+
+        # Kapanışta kuyrukta kalan veriler kaybolmasın
+        while True:
+            try:
+                item = self.upload_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] == 'data':
+                self.pending_batch.append(item[1])
+            elif item[0] == 'summary':
+                self.pending_summaries.append(item[1])
+            elif item[0] == 'record':
+                self.pending_records.append(item[1:])
+
+        if self.pending_batch or self.pending_summaries or self.pending_records:
+            self.save_batch_to_database(self.pending_batch, self.pending_summaries, self.pending_records)
+            self.pending_batch, self.pending_summaries, self.pending_records = [], [], []
+        self.flush_spool(force=True)
+
+        # Hata kayıtları yerelde tutulmaz, sunucu erişilebilirse pencere beklenmeden gönderilir
+        errors = self.pending_errors + self.errors.due(force=True)
+        if errors and self.breaker.state == CircuitBreaker.CLOSED:
+            self.send_batch_to_server([], (), errors)
+
+    def metrics_gauges(self):
+        """Anlık durum değerleri (kuyruk ve yerel veritabanı derinliği vb.)"""
+        return {
+            'spool_pending': self.pending_count,
+            'spool_pending_summaries': self.pending_summary_count,
+            'spool_pending_records': self.pending_record_count,
+            'upload_queue_depth': self.upload_queue.qsize(),
+            'pending_batch': len(self.pending_batch) + len(self.pending_summaries) + len(self.pending_records),
+            'errors_pending': len(self.errors.pending) + len(self.pending_errors),
+            'breaker_state': self.breaker.state,
+            'startup_ms': {name: round(elapsed * 1000, 1) for name, elapsed in self.startup_timings.items()},
+            'serial_connected': {reader.port: reader.connected for reader in self.readers},
+            'serial_binary': {reader.port: reader.binary_seen for reader in self.readers},
+            'nodes_seen': len(self.liveness.last_seen) if self.liveness else 0,
+            'nodes_down': sorted(self.liveness.down) if self.liveness else []
+        }
+
+    def write_metrics_snapshot(self):
+        """METRICS_SNAPSHOT_INTERVAL dolduysa hızları güncelle ve metrik dosyasını yaz"""
+        current_time = time.time()
+        if current_time - self.last_metrics_write_time < METRICS_SNAPSHOT_INTERVAL:
+            return
+        self.last_metrics_write_time = current_time
+        self.metrics.update_rates()
+
+        if not METRICS_SNAPSHOT_PATH:
+            return
+        try:
+            # Yarım yazılmış dosya okunmasın diye önce geçici dosyaya yaz
+            temp_path = METRICS_SNAPSHOT_PATH + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self.metrics.snapshot(self.metrics_gauges()), f, indent=2)
+            os.replace(temp_path, METRICS_SNAPSHOT_PATH)
+        except OSError as e:
+            logger.error("Metrik dosyası yazılamadı: %s", e)
+
+    def start_metrics_server(self):
+        """127.0.0.1:METRICS_HTTP_PORT üzerinde /metrics endpoint'ini başlat"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        sender = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = json.dumps(sender.metrics.snapshot(sender.metrics_gauges())).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Her istek için çıktı basılmasın
+
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', METRICS_HTTP_PORT), MetricsHandler)
+        except OSError as e:
+            logger.error("Metrik sunucusu başlatılamadı: %s", e)
+            return
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        logger.info("Metrikler: http://127.0.0.1:%d/metrics", METRICS_HTTP_PORT)
+
+    def init_session(self):
+        """requests'i yükle ve keep-alive HTTP oturumunu aç (yükleyici thread'inde)"""
+        global requests
+        import requests
+        self.session = requests.Session()  # Keep-alive bağlantı tekrar kullanılır
+        self.mark_startup('http_ready')
+
+    def mark_startup(self, stage):
+        """Açılış aşamasının (ilk kez gerçekleştiğinde) STARTUP_T0'dan geçen süresini kaydet ve yazdır"""
+        elapsed = time.perf_counter() - STARTUP_T0
+        with self.startup_lock:
+            if stage in self.startup_timings:
+                return
+            self.startup_timings[stage] = elapsed
+        logger.info("Açılış süresi - %s: %.0f ms", stage, elapsed * 1000)
+
+    def startup_sync(self):
+        """Sunucuyu yokla, erişilebilirse birikmiş verileri gönder (yükleyici thread'inde, seri okuma başladıktan sonra)"""
+        self.init_session()
+        if self.check_connection():
+            logger.info("Sunucu bağlantısı mevcut, offline veriler kontrol ediliyor...")
+            self.send_offline_data()
+        else:
+            logger.warning("Sunucu bağlantısı yok, offline modda başlanıyor...")
+            self.breaker.trip()
+        self.mark_startup('backlog_checked')
+
+    def start_uploader(self):
+        """Yükleyici thread'ini başlat"""
+        self.uploader_thread = threading.Thread(target=self.upload_worker, name='uploader', daemon=True)
+        self.uploader_thread.start()
+
+    def server_available(self):
+        """
+        Devre kesiciye göre sunucuya istek yapılabilir mi?
+        Yarı açık durumda ping ile yoklar, sunucu döndüyse bekleyen verileri gönderir.
+        """
+        if not self.breaker.allow_request():
+            return False
+
+        if self.breaker.state == CircuitBreaker.HALF_OPEN:
+            if not self.check_connection():
+                self.breaker.record_failure()
                 return False
-                
+            self.breaker.record_success()
+            self.send_offline_data()
+
+        return True
+
+    def check_connection(self):
+        """Sunucu bağlantısını /ping ile kontrol et"""
+        try:
+            response = self.session.get(PING_URL, timeout=2)
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+
     def run(self):
         """Ana döngü"""
-        print("Sensör veri aktarımı başlatıldı...")
-        print("Tüm gelen veriler sunucuya gönderilecek.")
-        print(f"Hedef URL: {TARGET_URL}")
-        print(f"Hata URL: {ERROR_URL}")
-        print(f"Hata raporlama aralığı: {ERROR_REPORT_INTERVAL} saniye (10 dakika)\n")
+        logger.info("Sensör veri aktarımı başlatıldı...")
+        logger.info("Tüm gelen veriler sunucuya gönderilecek.")
+        logger.info("Toplu gönderim URL: %s (veriler, özetler ve hata kayıtları)", V2_URL)
+        logger.info("Bağlantı kontrol URL: %s", PING_URL)
+        logger.info("Hata raporlama aralığı: %d saniye (10 dakika)", ERROR_REPORT_INTERVAL)
         
-        # Program başladığında offline verileri göndermeyi dene
-        if self.check_connection():
-            print("Sunucu bağlantısı mevcut, offline veriler kontrol ediliyor...")
-            self.send_offline_data()
-        else:
-            print("Sunucu bağlantısı yok, offline modda başlanıyor...")
+        # Önce seri portlar açılır: açılış sırasında koordinatörün yazdıkları kaybolmasın.
+        # Her koordinatörün seri portu ayrı thread'de okunur, hepsi aynı işleme hattını kullanır
+        for reader in self.readers:
+            reader.start(self.reader_stop_event)
         
-        # Seri portu başlat
-        if not self.init_serial():
-            print("Seri port bağlanamadı, ilk hata mesajı sunucuya gönderiliyor...")
-            self.send_error_to_server(
-                'serial_port_error',
-                'Seri port bağlantısı kurulamadı'
-            )
-            self.last_serial_error_time = time.time()
+        # Gönderim ayrı thread'de, seri okuma ağ yüzünden beklemez.
+        # Sunucu yoklaması ve birikmiş verilerin gönderimi de bu thread'de yapılır (startup_sync)
+        self.start_uploader()
+        if METRICS_HTTP_PORT:
+            self.start_metrics_server()
             
-        buffer = ""  # Veri biriktirme buffer'ı
         last_error_check_time = time.time()
-        serial_retry_time = time.time()
-        SERIAL_RETRY_INTERVAL = 30  # 30 saniyede bir seri port bağlantısını dene
             
         try:
             while True:
                 current_time = time.time()
                 
-                # Seri port bağlı değilse periyodik olarak bağlanmayı dene
-                if not self.serial_connected:
-                    if current_time - serial_retry_time > SERIAL_RETRY_INTERVAL:
-                        print("Seri port bağlantısı deneniyor...")
-                        if self.init_serial():
-                            print("Seri port bağlantısı başarılı!")
-                            self.last_data_time = time.time()  # Bağlantı kurulduğunda zamanı sıfırla
-                        serial_retry_time = current_time
-                    
-                    # Hata kontrolü ve raporlama (10 dakikada bir)
-                    if current_time - last_error_check_time >= 60:  # Her 1 dakikada kontrol et
-                        self.check_and_report_errors()
-                        last_error_check_time = current_time
-                    
-                    time.sleep(1)
-                    continue
-                
-                # Seri port bağlıysa veri oku
-                try:
-                    if self.ser.in_waiting > 0:
-                        # Gelen veriyi buffer'a ekle
-                        new_data = self.ser.read(self.ser.in_waiting).decode(errors='ignore')
-                        buffer += new_data
-                        
-                        # Satır sonlarına göre veriyi böl
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            line = line.strip()
-                            
-                            if line:
-                                # Veriyi parse et
-                                parsed_json = self.parse_sensor_data(line)
-                                
-                                if parsed_json:
-                                    timestamp = self.get_timestamp()
-                                    print(f"İşlenen veri: {line}")
-                                    
-                                    # Veri gelme zamanını güncelle
-                                    self.last_data_time = time.time()
-                                    
-                                    # Önce sunucuya göndermeyi dene
-                                    if self.send_to_server(parsed_json, timestamp):
-                                        # Başarılı gönderim sonrası offline verileri kontrol et
-                                        self.send_offline_data()
-                                    else:
-                                        # Başarısız gönderim, yerel veritabanına kaydet
-                                        self.save_to_database(parsed_json, timestamp)
-                                else:
-                                    # Parse edilemeyen veriler için bilgi ver
-                                    print(f"Parse edilemeyen veri atlandı: {line}")
-                
-                except serial.SerialException as e:
-                    print(f"Seri port okuma hatası: {e}")
-                    self.serial_connected = False
-                    if hasattr(self, 'ser'):
-                        try:
-                            self.ser.close()
-                        except:
-                            pass
-                    
-                    # Hata zamanını güncelle
-                    self.last_serial_error_time = time.time()
-                    self.send_error_to_server(
-                        'serial_port_error',
-                        f'Seri port bağlantısı kesildi: {str(e)}'
-                    )
-                    
-                    serial_retry_time = time.time()
-                    continue
-                
                 # Her 1 dakikada bir hata kontrolü yap (10 dakikada bir gönderim yapılacak)
                 if current_time - last_error_check_time >= 60:
                     self.check_and_report_errors()
                     last_error_check_time = current_time
 
-                # Kısa bir bekleme
-                time.sleep(0.1)
+                # Susan düğümleri bildir (her saniye, yalnızca süresi dolan kayıtlara bakılır)
+                self.check_node_liveness()
+
+                # Süresi dolan toplama pencerelerini kapat (düğüm sustuysa da özet gönderilir)
+                if self.aggregator is not None:
+                    with self.filter_lock:
+                        summaries = self.aggregator.flush_expired()
+                    self.enqueue_summaries(summaries)
+
+                time.sleep(1)
                 
         except KeyboardInterrupt:
-            print("\nProgram durduruldu.")
+            logger.info("Program durduruldu.")
         finally:
             self.cleanup()
             
     def cleanup(self):
         """Temizlik işlemleri"""
-        if hasattr(self, 'ser') and self.serial_connected:
-            try:
-                self.ser.close()
-                print("Seri port kapatıldı")
-            except:
-                pass
+        # Önce okuyucular durur, kapanış sırasında yeni veri gelmez
+        self.reader_stop_event.set()
+        for reader in self.readers:
+            if reader.thread is not None:
+                reader.thread.join(timeout=SERIAL_READ_TIMEOUT + 2)
+        if self.aggregator is not None:
+            # Açık pencereler yarım da olsa kaybolmasın
+            self.enqueue_summaries(self.aggregator.flush_expired(force=True))
+        if self.uploader_thread is not None:
+            # Yükleyici kuyrukta kalanları yerel veritabanına yazıp çıkar
+            self.stop_event.set()
+            self.uploader_thread.join(timeout=15)
+        for reader in self.readers:
+            if reader.ser is not None:
+                reader.close()
+                logger.info("Seri port kapatıldı: %s", reader.port)
         if hasattr(self, 'conn'):
+            self.flush_spool(force=True)
             self.conn.close()
-            print("Veritabanı bağlantısı kapatıldı")
+            logger.info("Veritabanı bağlantısı kapatıldı")
 
 if __name__ == "__main__":
+    setup_logging()
     sender = SensorDataSender()
     sender.run()
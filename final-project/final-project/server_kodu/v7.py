@@ -2,6 +2,16 @@
 from flask import Flask, request, jsonify, render_template_string
 import sqlite3
 import json
+import zlib
+import functools
+import contextlib
+import logging
+import logging.handlers
+import atexit
+import queue
+import threading
+import sys
+import time
 from datetime import datetime
 import os
 
@@ -10,18 +20,129 @@ app = Flask(__name__)
 # Veritabanı ayarları
 DB_PATH = 'sensor_data.db'
 ERROR_DB_PATH = 'error_logs.db'
+DB_POOL_SIZE = 8  # Veritabanı başına boşta tutulan en fazla bağlantı (istekler arasında yeniden kullanılır)
+DB_BUSY_TIMEOUT = 5  # Yazma kilidi için en fazla bekleme (saniye)
+DB_SYNCHRONOUS = 'NORMAL'  # WAL ile NORMAL: commit fsync beklemez, elektrik kesintisinde yalnızca son işlemler kaybolabilir
+DB_CACHE_SIZE_KB = 8192  # Bağlantı başına sayfa önbelleği
+
+# Yazma kuyruğu (write-behind): kayıtlar tek yazıcı thread'inde toplu commit edilir
+WRITE_QUEUE_SIZE = 20000  # Yazılmayı bekleyen en fazla istek, doluysa 503 döner
+WRITE_BATCH_INTERVAL = 0.005  # Yazıcı ilk istekten sonra en fazla bu kadar toplayıp commit eder (saniye)
+WRITE_BATCH_MAX_ROWS = 2000  # Bu kadar satır birikince beklemeden commit edilir
+WRITE_SYNC_TIMEOUT = 10  # Senkron modda commit için en fazla bekleme (saniye)
+INGEST_SYNC = False  # True: /data ve /error her zaman commit sonrası yanıt verir (?sync=1 ile istek başına da seçilir)
+
+# Hata kayıtları: aynı tipteki hatalar bu süre içinde tek satırda birleştirilir (saniye)
+ERROR_COALESCE_WINDOW = 60
+ERROR_DELIVERY_RETENTION = 14 * 24 * 3600  # Tekrar gönderim tekilleştirmesi için sıra numaraları bu kadar tutulur (saniye)
+ERROR_MESSAGE_SEPARATOR = ' | '  # Birleştirilen satırda farklı mesajlar bu ayraçla tutulur (ağ geçidiyle aynı)
+ERROR_MESSAGE_MAX_LENGTH = 1000  # Birleştirilmiş mesaj en fazla bu uzunlukta, fazlası '...' ile kesilir
+
+# Zaman serisi özetleri: sensor_data her kayıtta düğüm başına dakika/saat/gün tablolarına işlenir
+ROLLUP_METRICS = ('light', 'temperature', 'humidity_air', 'humidity_ground')
+ROLLUP_RESOLUTIONS = {  # çözünürlük -> (tablo, dilim başlangıcı biçimi, dilim süresi saniye), inceden kabaya
+    'minute': ('sensor_rollup_minute', '%Y-%m-%dT%H:%M:00', 60),
+    'hour': ('sensor_rollup_hour', '%Y-%m-%dT%H:00:00', 3600),
+    'day': ('sensor_rollup_day', '%Y-%m-%dT00:00:00', 86400),
+}
+SERIES_MAX_POINTS = 500  # /api/series otomatik çözünürlükte en fazla bu kadar dilim döndürür
+SERIES_RAW_LIMIT = 10000  # resolution=raw için en fazla satır
+SERIES_DEFAULT_RANGE = 86400  # from verilmezse to'dan bu kadar öncesi (saniye)
+
+# v2 veri formatı ayarları
+MAX_DECOMPRESSED_BYTES = 16 * 1024 * 1024  # Sıkıştırılmış gövde açıldığında en fazla boyut
+
+# Günlük (log) ayarları
+LOG_LEVEL = 'INFO'  # İstek başına mesajlar (gelen veri/hata) DEBUG seviyesindedir
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(threadName)s] %(message)s'
+LOG_RATE_LIMIT = 20  # Şablon başına LOG_RATE_INTERVAL içinde en fazla mesaj (0: sınırsız)
+LOG_RATE_INTERVAL = 60  # saniye
+LOG_SAMPLING = {}  # Şablon -> N: her N mesajdan biri yazılır, ör. {'Hata: %s': 10} (geçersiz istekler)
+LOG_QUEUE_SIZE = 10000  # Dinleyici thread'inin kuyruğu, doluysa yeni mesajlar atılır
+ACCESS_LOG = False  # Her HTTP isteği için werkzeug erişim satırı yazılsın mı
+
+logger = logging.getLogger('server')
+
+class LogRateLimiter(logging.Filter):
+    """
+    Mesaj şablonu başına örnekleme ve hız sınırı (thread güvenli).
+    Yük altında her reddedilen istek aynı şablonu ('Yazma yapılamadı: %s') yazar;
+    aralıktaki fazlası atlanır, sayısı sonraki aralığın ilk mesajına eklenir.
+    """
+
+    def __init__(self, rate_limit, interval, sampling):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.interval = interval
+        self.sampling = sampling
+        self.lock = threading.Lock()
+        self.windows = {}  # şablon -> [aralık başlangıcı, yazılan, atlanan]
+        self.sample_counts = {}  # şablon -> görülen mesaj sayısı
+
+    def filter(self, record):
+        template = record.msg
+        suppressed = 0
+        with self.lock:
+            every = self.sampling.get(template)
+            if every:
+                seen = self.sample_counts.get(template, 0)
+                self.sample_counts[template] = seen + 1
+                if seen % every:
+                    return False
+
+            if self.rate_limit:
+                window = self.windows.get(template)
+                if window is None or record.created - window[0] >= self.interval:
+                    suppressed = window[2] if window else 0
+                    self.windows[template] = [record.created, 1, 0]
+                elif window[1] < self.rate_limit:
+                    window[1] += 1
+                else:
+                    window[2] += 1
+                    return False
+
+        if suppressed and isinstance(record.args, tuple):
+            record.msg = f'{template} (önceki aralıkta %d benzer mesaj atlandı)'
+            record.args = record.args + (suppressed,)
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Kaydı biçimlendirmeden kuyruğa bırakır, istek thread'i yazmayı beklemez (kuyruk doluysa atılır)"""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def setup_logging(level=LOG_LEVEL):
+    """Günlük hattını kur: istek ve yazıcı thread'leri kuyruğa bırakır, dinleyici thread'i stdout'a yazar"""
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(LogRateLimiter(LOG_RATE_LIMIT, LOG_RATE_INTERVAL, LOG_SAMPLING))
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)  # Kapanışta kuyrukta kalanlar yazılır
+    return listener
+
 
 def init_database():
-    """Veritabanını başlat"""
+    """Veritabanını başlat (mevcut veriler korunur, eksik sütun ve indeksler eklenir)"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')  # Kalıcıdır, dosyada saklanır
     
-    # Önce tabloyu sil (eğer varsa)
-    cursor.execute('DROP TABLE IF EXISTS sensor_data')
-    
-    # Yeniden oluştur
     cursor.execute('''
-        CREATE TABLE sensor_data (
+        CREATE TABLE IF NOT EXISTS sensor_data (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             node_id INTEGER NOT NULL,
             light REAL,
@@ -31,18 +152,249 @@ def init_database():
             rx_drift INTEGER,
             tx_drift INTEGER,
             timestamp TEXT NOT NULL,
+            coordinator TEXT,
+            gateway_id TEXT,
+            seq INTEGER,
+            sample_count INTEGER NOT NULL DEFAULT 1,
             received_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
+    # Ağ geçidinde toplanan pencere özetleri (düğüm + metrik + pencere başına bir satır)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_summaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            node_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            window_start TEXT NOT NULL,
+            window_end TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            min REAL,
+            max REAL,
+            mean REAL,
+            last REAL,
+            gateway_id TEXT,
+            seq INTEGER,
+            received_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Diğer koordinatör yazılımlarının kayıtları (clock-drift, energest)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS drift_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            node_id INTEGER NOT NULL,
+            current_drift INTEGER,
+            estimated_drift INTEGER,
+            node_timestamp INTEGER,
+            valid INTEGER,
+            timestamp TEXT NOT NULL,
+            coordinator TEXT,
+            gateway_id TEXT,
+            seq INTEGER,
+            received_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS environment_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            node_id INTEGER,
+            metric TEXT NOT NULL,
+            value REAL,
+            timestamp TEXT NOT NULL,
+            coordinator TEXT,
+            gateway_id TEXT,
+            seq INTEGER,
+            received_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # İlk sürümde energest_data.node_id NOT NULL idi; SQLite kısıtı kaldıramadığı için tablo yeniden kurulur
+    energest_columns = list(cursor.execute('PRAGMA table_info(energest_data)'))
+    rebuild_energest = any(row[1] == 'node_id' and row[3] for row in energest_columns)
+    if rebuild_energest:
+        cursor.execute('ALTER TABLE energest_data RENAME TO energest_data_old')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS energest_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            node_id INTEGER,
+            total_cpu INTEGER,
+            total_lpm INTEGER,
+            total_deep_lpm INTEGER,
+            total_tx INTEGER,
+            total_rx INTEGER,
+            total_listen INTEGER,
+            timestamp TEXT NOT NULL,
+            coordinator TEXT,
+            gateway_id TEXT,
+            seq INTEGER,
+            received_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if rebuild_energest:
+        columns = ', '.join(row[1] for row in energest_columns)
+        cursor.execute(f'INSERT INTO energest_data ({columns}) SELECT {columns} FROM energest_data_old')
+        cursor.execute('DROP TABLE energest_data_old')
+    
+    # Önceki sürümlerin tablolarında koordinatör, tekilleştirme ve seyreltme sütunları yok
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(sensor_data)')}
+    for column, column_type in (('coordinator', 'TEXT'), ('gateway_id', 'TEXT'), ('seq', 'INTEGER'),
+                                ('sample_count', 'INTEGER NOT NULL DEFAULT 1')):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE sensor_data ADD COLUMN {column} {column_type}')
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(sensor_summaries)')}
+    for column, column_type in (('gateway_id', 'TEXT'), ('seq', 'INTEGER')):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE sensor_summaries ADD COLUMN {column} {column_type}')
+    
+    # Ağ geçidinin tekrar gönderdiği kayıtlar (gateway_id, seq) ile ayıklanır.
+    # Kimliksiz (v1) kayıtlarda alanlar NULL'dır, NULL değerler benzersizlik kontrolüne girmez.
+    for table in ('sensor_data', 'sensor_summaries') + tuple(RECORD_TABLES.values()):
+        cursor.execute(f'''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_gateway_seq
+            ON {table} (gateway_id, seq)
+        ''')
+    
+    # Panel ve API okumaları: son kayıtlar indeksin sonundan okunur, tablo sıralanmaz
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sensor_data_received_at ON sensor_data (received_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sensor_data_node_time ON sensor_data (node_id, timestamp)')
+    
+    # Panel istatistikleri: her kayıtta aynı işlem içinde tetikleyicilerle güncellenen tek satır.
+    # Ortalamalar NULL olmayan değerlerin toplamı / sayısıdır (AVG ile aynı).
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_records INTEGER NOT NULL DEFAULT 0,
+            active_nodes INTEGER NOT NULL DEFAULT 0,
+            temperature_sum REAL NOT NULL DEFAULT 0,
+            temperature_count INTEGER NOT NULL DEFAULT 0,
+            humidity_air_sum REAL NOT NULL DEFAULT 0,
+            humidity_air_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_node_stats (
+            node_id INTEGER PRIMARY KEY,
+            records INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS sensor_stats_insert AFTER INSERT ON sensor_data
+        BEGIN
+            UPDATE sensor_stats SET
+                total_records = total_records + 1,
+                temperature_sum = temperature_sum + COALESCE(NEW.temperature, 0),
+                temperature_count = temperature_count + (NEW.temperature IS NOT NULL),
+                humidity_air_sum = humidity_air_sum + COALESCE(NEW.humidity_air, 0),
+                humidity_air_count = humidity_air_count + (NEW.humidity_air IS NOT NULL)
+            WHERE id = 1;
+            INSERT INTO sensor_node_stats (node_id, records) VALUES (NEW.node_id, 1)
+            ON CONFLICT (node_id) DO UPDATE SET records = records + 1;
+        END
+    ''')
+    # Yalnızca ilk kez görülen düğümde çalışır (UPSERT'ün güncelleme yolu INSERT tetikleyicisini çalıştırmaz)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS sensor_node_stats_insert AFTER INSERT ON sensor_node_stats
+        BEGIN
+            UPDATE sensor_stats SET active_nodes = active_nodes + 1 WHERE id = 1;
+        END
+    ''')
+    rebuild_sensor_stats(cursor)
+    
+    # Zaman serisi özetleri: (düğüm, dilim) başına her metrik için sayı/min/maks/toplam/son değer.
+    # Aynı tetikleyici yazma işleminin içinde üç çözünürlüğü birden günceller.
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, _, _ in ROLLUP_RESOLUTIONS.values():
+        metric_columns = ''.join(f''',
+            {metric}_count INTEGER NOT NULL,
+            {metric}_min REAL,
+            {metric}_max REAL,
+            {metric}_sum REAL NOT NULL,
+            {metric}_last REAL''' for metric in ROLLUP_METRICS)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                node_id INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                last_timestamp TEXT NOT NULL{metric_columns},
+                PRIMARY KEY (node_id, bucket)
+            ) WITHOUT ROWID
+        ''')
+    statements = ''.join(rollup_upsert_sql(table, bucket_format, 'NEW.') + ';\n'
+                         for table, bucket_format, _ in ROLLUP_RESOLUTIONS.values())
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS sensor_rollup_insert AFTER INSERT ON sensor_data
+        BEGIN
+        {statements}
+        END
+    ''')
+    # Tablolar yeni oluşturulduysa (eski veritabanı) mevcut kayıtlardan doldurulur
+    if any(table not in existing for table, _, _ in ROLLUP_RESOLUTIONS.values()):
+        rebuild_sensor_rollups(cursor)
+    
     conn.commit()
     conn.close()
-    print(f"Veritabanı yeniden oluşturuldu: {DB_PATH}")
+    logger.info("Veritabanı hazır: %s", DB_PATH)
+
+def rebuild_sensor_stats(cursor):
+    """İstatistik tablolarını sensor_data'dan yeniden hesapla (açılışta ve temizlikte)"""
+    cursor.execute('DELETE FROM sensor_node_stats')
+    cursor.execute('''
+        INSERT OR REPLACE INTO sensor_stats
+        SELECT 1, COUNT(*), 0,
+               COALESCE(SUM(temperature), 0), COUNT(temperature),
+               COALESCE(SUM(humidity_air), 0), COUNT(humidity_air)
+        FROM sensor_data
+    ''')
+    # active_nodes her düğüm satırında sensor_node_stats_insert tetikleyicisiyle artar
+    cursor.execute('''
+        INSERT INTO sensor_node_stats (node_id, records)
+        SELECT node_id, COUNT(*) FROM sensor_data GROUP BY node_id
+    ''')
+
+def rollup_upsert_sql(table, bucket_format, source):
+    """
+    Özet tablosuna satır ekleyen/birleştiren UPSERT.
+    source 'NEW.' ise tetikleyicideki yeni satırdan, boşsa tüm sensor_data'dan okur.
+    Zaman damgası çözülemeyen kayıtlar (strftime NULL) özetlere girmez.
+    """
+    bucket = f"strftime('{bucket_format}', {source}timestamp)"
+    columns = ['node_id', 'bucket', 'last_timestamp']
+    values = [f'{source}node_id', bucket, f'{source}timestamp']
+    updates = ['last_timestamp = MAX(last_timestamp, excluded.last_timestamp)']
+    for metric in ROLLUP_METRICS:
+        value = f'{source}{metric}'
+        columns += [f'{metric}_count', f'{metric}_min', f'{metric}_max', f'{metric}_sum', f'{metric}_last']
+        values += [f'{value} IS NOT NULL', value, value, f'COALESCE({value}, 0)', value]
+        # Skaler MIN/MAX NULL görürse NULL döner; değeri olmayan taraf diğerine eşitlenir.
+        # Son değer, geç gelen (eski zamanlı) kayıtlarla değil en yeni zaman damgasıyla belirlenir.
+        updates += [
+            f'{metric}_count = {metric}_count + excluded.{metric}_count',
+            f'{metric}_min = MIN(COALESCE({metric}_min, excluded.{metric}_min), '
+            f'COALESCE(excluded.{metric}_min, {metric}_min))',
+            f'{metric}_max = MAX(COALESCE({metric}_max, excluded.{metric}_max), '
+            f'COALESCE(excluded.{metric}_max, {metric}_max))',
+            f'{metric}_sum = {metric}_sum + excluded.{metric}_sum',
+            f'{metric}_last = CASE WHEN excluded.{metric}_last IS NOT NULL AND '
+            f'({metric}_last IS NULL OR excluded.last_timestamp >= last_timestamp) '
+            f'THEN excluded.{metric}_last ELSE {metric}_last END',
+        ]
+    source_table = '' if source else 'FROM sensor_data'
+    return f'''
+            INSERT INTO {table} ({', '.join(columns)})
+            SELECT {', '.join(values)} {source_table}
+            WHERE {bucket} IS NOT NULL
+            ON CONFLICT (node_id, bucket) DO UPDATE SET {', '.join(updates)}'''
+
+def rebuild_sensor_rollups(cursor):
+    """Zaman serisi özetlerini sensor_data'dan yeniden hesapla"""
+    for table, bucket_format, _ in ROLLUP_RESOLUTIONS.values():
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(rollup_upsert_sql(table, bucket_format, ''))
 
 def init_error_database():
     """Hata veritabanını başlat"""
     conn = sqlite3.connect(ERROR_DB_PATH)
     cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS error_logs (
@@ -50,25 +402,489 @@ def init_error_database():
             error_type TEXT NOT NULL,
             error_message TEXT NOT NULL,
             timestamp TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            first_seen TEXT,
+            last_seen TEXT,
+            gateway_id TEXT,
             received_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
+    # Önceki sürümün tablosunda birleştirme sütunları yok
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(error_logs)')}
+    if 'count' not in columns:
+        cursor.execute('ALTER TABLE error_logs ADD COLUMN count INTEGER NOT NULL DEFAULT 1')
+        cursor.execute('ALTER TABLE error_logs ADD COLUMN first_seen TEXT')
+        cursor.execute('ALTER TABLE error_logs ADD COLUMN last_seen TEXT')
+        cursor.execute('ALTER TABLE error_logs ADD COLUMN gateway_id TEXT')
+        cursor.execute('UPDATE error_logs SET first_seen = timestamp, last_seen = timestamp')
+    
+    # Son hatalar received_at indeksinden okunur; birleştirme sorgusu tip + zamana göre arar
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_error_logs_received_at ON error_logs (received_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_error_logs_type ON error_logs (error_type, received_at)')
+    
+    # Ağ geçidi hata kayıtlarının tekilleştirmesi: (gateway_id, seq) başına işlenmiş birikimli sayı.
+    # Ağ geçidi kayıtları bellekte tutar; ERROR_DELIVERY_RETENTION'dan eski satırlar açılışta silinir.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS error_deliveries (
+            gateway_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (gateway_id, seq)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        f"DELETE FROM error_deliveries WHERE received_at < datetime('now', '-{ERROR_DELIVERY_RETENTION} seconds')"
+    )
+    
+    # Hata istatistikleri: yeni satırda ve birleştirmede (count / timestamp güncellemesi) tetikleyicilerle güncellenir
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS error_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_errors INTEGER NOT NULL DEFAULT 0,
+            error_types INTEGER NOT NULL DEFAULT 0,
+            last_error_time TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS error_type_stats (
+            error_type TEXT PRIMARY KEY,
+            records INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS error_stats_insert AFTER INSERT ON error_logs
+        BEGIN
+            UPDATE error_stats SET
+                total_errors = total_errors + NEW.count,
+                last_error_time = COALESCE(MAX(last_error_time, NEW.timestamp), NEW.timestamp)
+            WHERE id = 1;
+            INSERT INTO error_type_stats (error_type, records) VALUES (NEW.error_type, 1)
+            ON CONFLICT (error_type) DO UPDATE SET records = records + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS error_stats_update AFTER UPDATE OF count, timestamp ON error_logs
+        BEGIN
+            UPDATE error_stats SET
+                total_errors = total_errors + NEW.count - OLD.count,
+                last_error_time = COALESCE(MAX(last_error_time, NEW.timestamp), NEW.timestamp)
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS error_type_stats_insert AFTER INSERT ON error_type_stats
+        BEGIN
+            UPDATE error_stats SET error_types = error_types + 1 WHERE id = 1;
+        END
+    ''')
+    rebuild_error_stats(cursor)
+    
     conn.commit()
     conn.close()
-    print(f"Hata veritabanı hazır: {ERROR_DB_PATH}")
+    logger.info("Hata veritabanı hazır: %s", ERROR_DB_PATH)
+
+# Panel ve API okumaları (sorgu planları check_query_plans ile doğrulanır)
+RECENT_DATA_SQL = '''
+    SELECT * FROM sensor_data 
+    ORDER BY received_at DESC 
+    LIMIT 50
+'''
+
+RECENT_ERRORS_SQL = '''
+    SELECT * FROM error_logs 
+    ORDER BY received_at DESC 
+    LIMIT 50
+'''
+
+# /api/series sorguları ({metric} ROLLUP_METRICS içinden, {table} ROLLUP_RESOLUTIONS içinden gelir)
+SERIES_ROLLUP_SQL = '''
+    SELECT
+        bucket,
+        {metric}_count as count,
+        {metric}_min as min,
+        {metric}_max as max,
+        {metric}_sum / {metric}_count as mean,
+        {metric}_last as last
+    FROM {table}
+    WHERE node_id = ? AND bucket >= ? AND bucket <= ? AND {metric}_count > 0
+    ORDER BY bucket
+'''
+
+SERIES_RAW_SQL = '''
+    SELECT timestamp, {metric} as value
+    FROM sensor_data
+    WHERE node_id = ? AND timestamp >= ? AND timestamp <= ? AND {metric} IS NOT NULL
+    ORDER BY timestamp
+    LIMIT ?
+'''
+
+# Panel istatistikleri tablo taranmadan tek satırdan okunur (tetikleyicilerle güncel tutulur)
+SENSOR_STATS_SQL = '''
+    SELECT 
+        total_records,
+        active_nodes,
+        temperature_sum / NULLIF(temperature_count, 0) as avg_temp,
+        humidity_air_sum / NULLIF(humidity_air_count, 0) as avg_humidity
+    FROM sensor_stats
+    WHERE id = 1
+'''
+
+ERROR_STATS_SQL = '''
+    SELECT 
+        total_errors,
+        error_types,
+        last_error_time
+    FROM error_stats
+    WHERE id = 1
+'''
+
+class ConnectionPool:
+    """
+    Tek veritabanı dosyası için yeniden kullanılan bağlantılar.
+    Geliştirme sunucusu her isteği yeni bir thread'de çalıştırdığından bağlantılar thread'e
+    değil havuza bağlıdır: istek boşta bir bağlantı alır, bitince geri bırakır. Bağlantı
+    açma ve PRAGMA ayarları yalnızca havuz boşken yapılır. WAL modunda okuyucular
+    yazıcıyı beklemez, yazıcı da okuyucuları.
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.idle = queue.LifoQueue(maxsize=size)  # Son kullanılan bağlantı önce (önbelleği sıcak)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Havuzdan bağlantı al, blok bitince geri bırak"""
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                # Hata nedeniyle commit edilmemiş işlem sonraki isteğe taşınmasın
+                conn.rollback()
+            try:
+                self.idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Boştaki bağlantıları kapat"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+# Veritabanı yolu -> havuz (yollar çalışma anında değiştirilebildiği için ilk kullanımda oluşturulur)
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path):
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+            atexit.register(pool.close)
+        return pool
+
+def rebuild_error_stats(cursor):
+    """Hata istatistik tablolarını error_logs'tan yeniden hesapla (açılışta ve temizlikte)"""
+    cursor.execute('DELETE FROM error_type_stats')
+    cursor.execute('''
+        INSERT OR REPLACE INTO error_stats
+        SELECT 1, COALESCE(SUM(count), 0), 0, MAX(timestamp)
+        FROM error_logs
+    ''')
+    # error_types her tip satırında error_type_stats_insert tetikleyicisiyle artar
+    cursor.execute('''
+        INSERT INTO error_type_stats (error_type, records)
+        SELECT error_type, COUNT(*) FROM error_logs GROUP BY error_type
+    ''')
 
 def get_db_connection():
-    """Veritabanı bağlantısı al"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Veritabanı bağlantısı al (with bloğu bitince havuza döner)"""
+    return get_pool(DB_PATH).connection()
 
 def get_error_db_connection():
-    """Hata veritabanı bağlantısı al"""
-    conn = sqlite3.connect(ERROR_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Hata veritabanı bağlantısı al (with bloğu bitince havuza döner)"""
+    return get_pool(ERROR_DB_PATH).connection()
+
+# Aynı ağ geçidinden aynı tipte, son ERROR_COALESCE_WINDOW içinde açılmış satır varsa ona eklenir
+FIND_ERROR_SQL = f'''
+    SELECT id, error_message FROM error_logs
+    WHERE id = (
+        SELECT MAX(id) FROM error_logs
+        WHERE error_type = ? AND gateway_id IS ?
+          AND received_at >= datetime('now', '-{ERROR_COALESCE_WINDOW} seconds')
+    )
+'''
+
+MERGE_ERROR_SQL = '''
+    UPDATE error_logs
+    SET count = count + ?,
+        error_message = ?,
+        first_seen = MIN(first_seen, ?),
+        last_seen = MAX(last_seen, ?),
+        timestamp = MAX(timestamp, ?)
+    WHERE id = ?
+'''
+
+# Ağ geçidinden gelen birleştirilmiş hata kayıtları için işlenmiş birikimli sayı
+FIND_ERROR_DELIVERY_SQL = 'SELECT count FROM error_deliveries WHERE gateway_id = ? AND seq = ?'
+
+UPSERT_ERROR_DELIVERY_SQL = '''
+    INSERT INTO error_deliveries (gateway_id, seq, count) VALUES (?, ?, ?)
+    ON CONFLICT (gateway_id, seq) DO UPDATE SET count = excluded.count, received_at = CURRENT_TIMESTAMP
+'''
+
+INSERT_ERROR_SQL = '''
+    INSERT INTO error_logs (gateway_id, error_type, error_message, count, first_seen, last_seen, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+def merge_error_message(current, new):
+    """Satırdaki mesajlara yenilerini ekle (tekrarlar atlanır, ağ geçidinden gelen birleşik mesajlar ayrıştırılır)"""
+    if not current:
+        return new
+    parts = current.split(ERROR_MESSAGE_SEPARATOR)
+    for part in new.split(ERROR_MESSAGE_SEPARATOR) if new else ():
+        if part in parts:
+            continue
+        if parts[-1] == '...':
+            break
+        if len(ERROR_MESSAGE_SEPARATOR.join(parts + [part])) > ERROR_MESSAGE_MAX_LENGTH:
+            parts.append('...')
+            break
+        parts.append(part)
+    return ERROR_MESSAGE_SEPARATOR.join(parts)
+
+def store_errors(cursor, errors):
+    """
+    Hata satırlarını (gateway_id, tip, mesaj, sayı, ilk görülme, son görülme, seq) kaydet.
+    Pencere içinde aynı tipte satır varsa yeni satır açılmaz, sayı ve zamanlar güncellenir;
+    farklı mesajlar (ör. farklı düğüm veya port) satırın mesajına eklenir.
+    Sıra numaralı kayıtta ağ geçidinin sayısı birikimlidir: daha önce aynı (gateway_id, seq)
+    için işlenen sayı düşülür, tekrar gönderilen kayıt ikinci kez sayılmaz.
+    """
+    for gateway_id, error_type, error_message, count, first_seen, last_seen, seq in errors:
+        if gateway_id is not None and seq is not None:
+            row = cursor.execute(FIND_ERROR_DELIVERY_SQL, (gateway_id, seq)).fetchone()
+            delivered = row[0] if row else 0
+            if count <= delivered:
+                continue
+            cursor.execute(UPSERT_ERROR_DELIVERY_SQL, (gateway_id, seq, count))
+            count -= delivered
+        row = cursor.execute(FIND_ERROR_SQL, (error_type, gateway_id)).fetchone()
+        if row is None:
+            cursor.execute(INSERT_ERROR_SQL, (gateway_id, error_type, error_message, count,
+                                              first_seen, last_seen, last_seen))
+        else:
+            cursor.execute(MERGE_ERROR_SQL, (count, merge_error_message(row[1], error_message),
+                                             first_seen, last_seen, last_seen, row[0]))
+
+class WriteRequest:
+    """Yazıcı kuyruğundaki tek istek: aynı veritabanında sırayla uygulanacak (SQL veya fonksiyon, satırlar) listesi"""
+
+    __slots__ = ('path', 'operations', 'rows', 'done', 'results', 'error')
+
+    def __init__(self, path, operations, wait=False):
+        self.path = path
+        self.operations = operations
+        self.rows = sum(len(rows) for _, rows in operations)
+        self.done = threading.Event() if wait else None  # Yalnızca sonucu beklenen isteklerde
+        self.results = None  # İşlem başına etkilenen satır sayısı
+        self.error = None
+
+    def wait(self, timeout=WRITE_SYNC_TIMEOUT):
+        """Commit edilene kadar bekle, işlem başına etkilenen satır sayılarını döndür"""
+        if not self.done.wait(timeout):
+            raise TimeoutError('Yazma zaman aşımına uğradı')
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+class IngestWriter:
+    """
+    Tek yazıcı thread'i ile grup commit. İstekler doğrulandıktan sonra kuyruğa bırakılır;
+    yazıcı ilk istekten sonra WRITE_BATCH_INTERVAL boyunca (veya WRITE_BATCH_MAX_ROWS dolana
+    kadar) gelenleri toplayıp veritabanı başına tek işlemde executemany ile yazar. Yanıtı
+    commit'i bekleyen (senkron) istek varsa beklenmez, kuyrukta birikenlerle hemen yazılır.
+    Commit (ve fsync) sayısı istek sayısından bağımsız olur; yazıcılar kilit için yarışmaz.
+    Toplu işlem hata verirse istekler tek tek yeniden yazılır, hatalı olan diğerlerini düşürmez.
+    Beklenmeyen bir hata da thread'i durdurmaz: istekler hatayla tamamlanır, döngü sürer.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.connections = {}  # Veritabanı yolu -> yazıcı thread'inin bağlantısı
+        self.stats = {
+            'requests': 0,
+            'rows': 0,
+            'batches': 0,
+            'failed': 0,
+            'rejected_full': 0,
+            'max_queue_depth': 0,
+            'last_batch_requests': 0,
+            'last_commit_ms': 0.0,
+        }
+        self.thread = threading.Thread(target=self.run, name='ingest-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, path, operations, wait=False):
+        """İsteği kuyruğa ekle (kuyruk doluysa queue.Full), wait ise WriteRequest.wait() ile beklenebilir"""
+        request = WriteRequest(path, operations, wait)
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            self.stats['rejected_full'] += 1
+            raise
+        depth = self.queue.qsize()
+        if depth > self.stats['max_queue_depth']:
+            self.stats['max_queue_depth'] = depth
+        return request
+
+    def flush(self, timeout=WRITE_SYNC_TIMEOUT):
+        """Şu ana kadar kuyruğa alınan tüm isteklerin commit edilmesini bekle"""
+        request = WriteRequest(DB_PATH, [], wait=True)
+        self.queue.put(request, timeout=timeout)
+        request.wait(timeout)
+
+    def run(self):
+        """Yazıcı döngüsü (ayrı thread)"""
+        while True:
+            batch = [self.queue.get()]
+            rows = batch[0].rows
+            waiting = batch[0].done is not None
+            deadline = time.monotonic() + WRITE_BATCH_INTERVAL
+            while rows < WRITE_BATCH_MAX_ROWS:
+                try:
+                    request = self.queue.get_nowait()
+                except queue.Empty:
+                    # Kuyruk boşaldı: yanıt bekleyen istek varsa hemen commit edilir
+                    # (önceki commit sürerken gelenler zaten birikmiştir), yoksa biraz daha toplanır
+                    timeout = deadline - time.monotonic()
+                    if waiting or timeout <= 0:
+                        break
+                    try:
+                        request = self.queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                batch.append(request)
+                rows += request.rows
+                waiting = waiting or request.done is not None
+            try:
+                self.write(batch)
+            except Exception as e:
+                logger.exception("Yazıcı hatası, %d istek yazılamadı: %s", len(batch), e)
+                for request in batch:
+                    if request.results is None and request.error is None:
+                        request.error = e
+                        self.stats['failed'] += 1
+            finally:
+                for request in batch:
+                    if request.done is not None:
+                        request.done.set()
+
+    def connection(self, path):
+        conn = self.connections.get(path)
+        if conn is None:
+            conn = self.connections[path] = get_pool(path).connect()
+        return conn
+
+    def discard(self, path):
+        """Yarım işlemi geri al; geri alınamazsa bağlantıyı kapat (sonraki yazmada yeniden açılır)"""
+        conn = self.connections.get(path)
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            del self.connections[path]
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def apply(self, conn, request):
+        cursor = conn.cursor()
+        results = []
+        for operation, rows in request.operations:
+            if callable(operation):
+                operation(cursor, rows)
+                results.append(len(rows))
+            else:
+                cursor.executemany(operation, rows)
+                results.append(cursor.rowcount)
+        return results
+
+    def write(self, batch):
+        """Toplanan istekleri veritabanı başına tek işlemde yaz (bekleyenleri run uyandırır)"""
+        started = time.perf_counter()
+        by_path = {}
+        for request in batch:
+            by_path.setdefault(request.path, []).append(request)
+
+        for path, requests in by_path.items():
+            try:
+                conn = self.connection(path)
+                for request in requests:
+                    request.results = self.apply(conn, request)
+                conn.commit()
+            except Exception as e:
+                self.discard(path)
+                logger.warning("Toplu yazma başarısız, istekler tek tek yazılıyor: %s", e)
+                for request in requests:
+                    try:
+                        conn = self.connection(path)
+                        request.results = self.apply(conn, request)
+                        conn.commit()
+                    except Exception as e:
+                        self.discard(path)
+                        request.results = None
+                        request.error = e
+                        self.stats['failed'] += 1
+                        logger.error("Kayıt yazılamadı: %s", e)
+
+        stats = self.stats
+        stats['requests'] += len(batch)
+        stats['rows'] += sum(request.rows for request in batch)
+        stats['batches'] += 1
+        stats['last_batch_requests'] = len(batch)
+        stats['last_commit_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Yazıcıyı ilk kullanımda başlat"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = IngestWriter()
+            atexit.register(_writer.flush)  # Kapanışta kuyrukta kalanlar yazılır
+        return _writer
+
+def want_sync():
+    """İstek commit sonrası mı yanıtlanmalı (INGEST_SYNC veya ?sync=1)"""
+    return INGEST_SYNC or request.args.get('sync') == '1'
+
+def write_unavailable(error):
+    """Yazma kuyruğu dolu veya commit zaman aşımına uğradı: istemci tekrar denemeli"""
+    logger.warning("Yazma yapılamadı: %s", error or 'yazma kuyruğu dolu')
+    return jsonify({'error': 'Sunucu meşgul, tekrar deneyin'}), 503
 
 # HTML Template
 HTML_TEMPLATE = '''
@@ -409,7 +1225,7 @@ HTML_TEMPLATE = '''
                     <tbody id="errorTable">
                         {% for error in error_data %}
                         <tr>
-                            <td><span class="error-badge">{{ error.error_type }}</span></td>
+                            <td><span class="error-badge">{{ error.error_type }}{% if error.count > 1 %} ×{{ error.count }}{% endif %}</span></td>
                             <td><span class="sensor-value">{{ error.error_message }}</span></td>
                             <td><span class="timestamp">{{ error.timestamp[:19] }}</span></td>
                             <td><span class="timestamp">{{ error.received_at[:19] }}</span></td>
@@ -516,7 +1332,7 @@ HTML_TEMPLATE = '''
                 result.data.forEach(error => {
                     const tr = document.createElement('tr');
                     tr.innerHTML = `
-                        <td><span class="error-badge">${error.error_type}</span></td>
+                        <td><span class="error-badge">${error.error_type}${error.count > 1 ? ' ×' + error.count : ''}</span></td>
                         <td><span class="sensor-value">${error.error_message}</span></td>
                         <td><span class="timestamp">${error.timestamp.substring(0, 19)}</span></td>
                         <td><span class="timestamp">${error.received_at.substring(0, 19)}</span></td>
@@ -590,44 +1406,18 @@ HTML_TEMPLATE = '''
 def index():
     """Ana sayfa"""
     try:
-        conn = get_db_connection()
-        error_conn = get_error_db_connection()
-        
-        # Son 50 sensör kaydı
-        data = conn.execute('''
-            SELECT * FROM sensor_data 
-            ORDER BY received_at DESC 
-            LIMIT 50
-        ''').fetchall()
-        
-        # Sensör istatistikleri
-        stats = conn.execute('''
-            SELECT 
-                COUNT(*) as total_records,
-                COUNT(DISTINCT node_id) as active_nodes,
-                AVG(temperature) as avg_temp,
-                AVG(humidity_air) as avg_humidity
-            FROM sensor_data
-        ''').fetchone()
-        
-        # Son 50 hata kaydı
-        error_data = error_conn.execute('''
-            SELECT * FROM error_logs 
-            ORDER BY received_at DESC 
-            LIMIT 50
-        ''').fetchall()
-        
-        # Hata istatistikleri
-        error_stats = error_conn.execute('''
-            SELECT 
-                COUNT(*) as total_errors,
-                COUNT(DISTINCT error_type) as error_types,
-                MAX(timestamp) as last_error_time
-            FROM error_logs
-        ''').fetchone()
-        
-        conn.close()
-        error_conn.close()
+        with get_db_connection() as conn, get_error_db_connection() as error_conn:
+            # Son 50 sensör kaydı
+            data = conn.execute(RECENT_DATA_SQL).fetchall()
+        
+            # Sensör istatistikleri
+            stats = conn.execute(SENSOR_STATS_SQL).fetchone()
+        
+            # Son 50 hata kaydı
+            error_data = error_conn.execute(RECENT_ERRORS_SQL).fetchall()
+        
+            # Hata istatistikleri
+            error_stats = error_conn.execute(ERROR_STATS_SQL).fetchone()
         
         return render_template_string(HTML_TEMPLATE, 
                                     data=data, 
@@ -636,33 +1426,19 @@ def index():
                                     error_stats=error_stats,
                                     current_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
     except Exception as e:
-        print(f"Ana sayfa hatası: {e}")
+        logger.error("Ana sayfa hatası: %s", e)
         return f"Hata: {e}", 500
 
 @app.route('/api/data')
 def api_data():
     """JSON formatında sensör veri API'si"""
     try:
-        conn = get_db_connection()
-        
-        # Son 50 kayıt
-        data = conn.execute('''
-            SELECT * FROM sensor_data 
-            ORDER BY received_at DESC 
-            LIMIT 50
-        ''').fetchall()
-        
-        # İstatistikler
-        stats = conn.execute('''
-            SELECT 
-                COUNT(*) as total_records,
-                COUNT(DISTINCT node_id) as active_nodes,
-                AVG(temperature) as avg_temp,
-                AVG(humidity_air) as avg_humidity
-            FROM sensor_data
-        ''').fetchone()
-        
-        conn.close()
+        with get_db_connection() as conn:
+            # Son 50 kayıt
+            data = conn.execute(RECENT_DATA_SQL).fetchall()
+        
+            # İstatistikler
+            stats = conn.execute(SENSOR_STATS_SQL).fetchone()
         
         # Row objelerini dictionary'ye çevir
         data_list = []
@@ -677,6 +1453,8 @@ def api_data():
                 'rx_drift': row['rx_drift'],
                 'tx_drift': row['tx_drift'],
                 'timestamp': row['timestamp'],
+                'coordinator': row['coordinator'],
+                'sample_count': row['sample_count'],
                 'received_at': row['received_at']
             })
         
@@ -693,32 +1471,19 @@ def api_data():
         })
         
     except Exception as e:
-        print(f"API veri hatası: {e}")
+        logger.error("API veri hatası: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/errors')
 def api_errors():
     """JSON formatında hata logları API'si"""
     try:
-        conn = get_error_db_connection()
-        
-        # Son 50 hata kaydı
-        data = conn.execute('''
-            SELECT * FROM error_logs 
-            ORDER BY received_at DESC 
-            LIMIT 50
-        ''').fetchall()
-        
-        # Hata istatistikleri
-        stats = conn.execute('''
-            SELECT 
-                COUNT(*) as total_errors,
-                COUNT(DISTINCT error_type) as error_types,
-                MAX(timestamp) as last_error_time
-            FROM error_logs
-        ''').fetchone()
-        
-        conn.close()
+        with get_error_db_connection() as conn:
+            # Son 50 hata kaydı
+            data = conn.execute(RECENT_ERRORS_SQL).fetchall()
+        
+            # Hata istatistikleri
+            stats = conn.execute(ERROR_STATS_SQL).fetchone()
         
         # Row objelerini dictionary'ye çevir
         data_list = []
@@ -727,6 +1492,9 @@ def api_errors():
                 'id': row['id'],
                 'error_type': row['error_type'],
                 'error_message': row['error_message'],
+                'count': row['count'],
+                'first_seen': row['first_seen'],
+                'last_seen': row['last_seen'],
                 'timestamp': row['timestamp'],
                 'received_at': row['received_at']
             })
@@ -743,9 +1511,136 @@ def api_errors():
         })
         
     except Exception as e:
-        print(f"API hata hatası: {e}")
+        logger.error("API hata hatası: %s", e)
         return jsonify({'error': str(e)}), 500
 
+def parse_series_time(value, default):
+    """
+    from/to parametresini ISO zamanına çevir (geçersizse ValueError).
+    Kayıtlar yerel saatle ve saat dilimi olmadan tutulur; dilimli değer yerel saate çevrilir.
+    """
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def pick_resolution(start, end):
+    """Aralığı SERIES_MAX_POINTS dilimle kapsayan en ince özet çözünürlüğü"""
+    seconds = (end - start).total_seconds()
+    for resolution, (_, _, bucket_seconds) in ROLLUP_RESOLUTIONS.items():
+        if seconds / bucket_seconds <= SERIES_MAX_POINTS:
+            return resolution
+    return resolution  # En kaba çözünürlük (ör. çok yıllık aralık)
+
+@app.route('/api/series')
+def api_series():
+    """
+    Bir düğümün tek metriğinin zaman serisi:
+    /api/series?node_id=&metric=&from=&to=&resolution=(auto|raw|minute|hour|day)
+    auto (varsayılan) aralığı en fazla SERIES_MAX_POINTS dilimle kapsayan özet tablosunu seçer.
+    """
+    try:
+        node_id = int(request.args.get('node_id', ''))
+    except ValueError:
+        return jsonify({'error': 'node_id tamsayı olmalıdır'}), 400
+    metric = request.args.get('metric', '')
+    if metric not in ROLLUP_METRICS:
+        return jsonify({'error': f'metric şunlardan biri olmalıdır: {", ".join(ROLLUP_METRICS)}'}), 400
+    try:
+        end = parse_series_time(request.args.get('to'), datetime.now())
+        start = parse_series_time(request.args.get('from'), None)
+    except ValueError as e:
+        return jsonify({'error': f'Geçersiz zaman: {e}'}), 400
+    if start is None:
+        start = datetime.fromtimestamp(end.timestamp() - SERIES_DEFAULT_RANGE)
+    if start > end:
+        return jsonify({'error': 'from, to değerinden sonra olamaz'}), 400
+    resolution = request.args.get('resolution', 'auto')
+    if resolution == 'auto':
+        resolution = pick_resolution(start, end)
+    elif resolution != 'raw' and resolution not in ROLLUP_RESOLUTIONS:
+        return jsonify({'error': f'Bilinmeyen çözünürlük: {resolution}'}), 400
+    
+    end_text = end.isoformat()
+    try:
+        with get_db_connection() as conn:
+            if resolution == 'raw':
+                rows = conn.execute(SERIES_RAW_SQL.format(metric=metric),
+                                    (node_id, start.isoformat(), end_text, SERIES_RAW_LIMIT)).fetchall()
+                points = [{'t': row['timestamp'], 'value': row['value']} for row in rows]
+            else:
+                table, bucket_format, _ = ROLLUP_RESOLUTIONS[resolution]
+                # İlk dilim aralık başlangıcını içeren dilimdir (kısmi dilimler dahil)
+                rows = conn.execute(SERIES_ROLLUP_SQL.format(metric=metric, table=table),
+                                    (node_id, start.strftime(bucket_format), end_text)).fetchall()
+                points = [{
+                    't': row['bucket'],
+                    'count': row['count'],
+                    'min': row['min'],
+                    'max': row['max'],
+                    'mean': row['mean'],
+                    'last': row['last']
+                } for row in rows]
+        
+        result = {
+            'node_id': node_id,
+            'metric': metric,
+            'resolution': resolution,
+            'from': start.isoformat(),
+            'to': end_text,
+            'points': points
+        }
+        if resolution == 'raw':
+            result['truncated'] = len(points) == SERIES_RAW_LIMIT
+        return jsonify(result)
+        
+    except Exception as e:
+        logger.error("Zaman serisi hatası: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+# Sensör kaydında bulunması gereken alanlar
+REQUIRED_FIELDS = ['node_id', 'light', 'temperature', 'humidity_air', 'humidity_ground', 'rx_drift', 'tx_drift']
+
+INSERT_SENSOR_SQL = '''
+    INSERT INTO sensor_data (node_id, light, temperature, humidity_air, humidity_ground, rx_drift, tx_drift, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def parse_reading(json_data):
+    """Gelen kaydı doğrula ve veritabanı satırına çevir, hatalıysa ValueError fırlat"""
+    if not isinstance(json_data, dict):
+        raise ValueError('Geçersiz kayıt formatı')
+
+    data_str = json_data.get('data', '')
+    timestamp = json_data.get('timestamp', datetime.now().isoformat())
+
+    if not data_str:
+        raise ValueError('Veri alanı boş')
+
+    # Sensör verisini parse et
+    try:
+        sensor_data = json.loads(data_str)
+    except (TypeError, json.JSONDecodeError):
+        raise ValueError('Geçersiz JSON format')
+
+    # Gerekli alanları kontrol et
+    for field in REQUIRED_FIELDS:
+        if field not in sensor_data:
+            raise ValueError(f'Eksik alan: {field}')
+
+    return (
+        sensor_data['node_id'],
+        sensor_data['light'],
+        sensor_data['temperature'],
+        sensor_data['humidity_air'],
+        sensor_data['humidity_ground'],
+        sensor_data['rx_drift'],
+        sensor_data['tx_drift'],
+        timestamp
+    )
+
 @app.route('/data', methods=['POST'])
 def receive_data():
     """Sensör verilerini al"""
@@ -754,63 +1649,392 @@ def receive_data():
         json_data = request.get_json()
         
         if not json_data:
-            print("Hata: JSON veri bulunamadı")
+            logger.warning("Hata: JSON veri bulunamadı")
             return jsonify({'error': 'JSON veri bulunamadı'}), 400
-            
-        data_str = json_data.get('data', '')
-        timestamp = json_data.get('timestamp', datetime.now().isoformat())
         
-        if not data_str:
-            print("Hata: Veri alanı boş")
-            return jsonify({'error': 'Veri alanı boş'}), 400
+        logger.debug("Gelen veri: %s", json_data.get('data', ''))
         
-        print(f"Gelen veri: {data_str}")
-        
-        # Sensör verisini parse et
         try:
-            sensor_data = json.loads(data_str)
-        except json.JSONDecodeError as e:
-            print(f"JSON parse hatası: {e}")
-            return jsonify({'error': 'Geçersiz JSON format'}), 400
-        
-        # Gerekli alanları kontrol et
-        required_fields = ['node_id', 'light', 'temperature', 'humidity_air', 'humidity_ground', 'rx_drift', 'tx_drift']
-        for field in required_fields:
-            if field not in sensor_data:
-                print(f"Eksik alan: {field}")
-                return jsonify({'error': f'Eksik alan: {field}'}), 400
-        
-        # Veritabanına kaydet
-        conn = get_db_connection()
-        cursor = conn.cursor()
+            row = parse_reading(json_data)
+        except ValueError as e:
+            logger.warning("Hata: %s", e)
+            return jsonify({'error': str(e)}), 400
+        
+        # Yazma kuyruğuna bırak, senkron modda commit edilmesini bekle
+        sync = want_sync()
+        write = get_writer().submit(DB_PATH, [(INSERT_SENSOR_SQL, [row])], wait=sync)
+        if sync:
+            write.wait()
+        
+        node_id, light, temperature, humidity_air, humidity_ground = row[:5]
+        logger.debug("✅ Veri kaydedildi - Node: %s, Sıcaklık: %s°C, Hava Nemi: %s%%, "
+                     "Toprak Nemi: %s%%, Işık: %s lux",
+                     node_id, temperature, humidity_air, humidity_ground, light)
+        
+        return jsonify({'status': 'success', 'message': 'Veri başarıyla kaydedildi', 'committed': sync}), 200
+        
+    except (queue.Full, TimeoutError) as e:
+        return write_unavailable(e)
+    except Exception as e:
+        logger.error("❌ Veri alma hatası: %s", e)
+        return jsonify({'error': f'Sunucu hatası: {str(e)}'}), 500
+
+@app.route('/data/batch', methods=['POST'])
+def receive_data_batch():
+    """Birden çok sensör verisini tek işlemde al"""
+    try:
+        json_data = request.get_json()
+        
+        if not json_data:
+            logger.warning("Hata: JSON veri bulunamadı")
+            return jsonify({'error': 'JSON veri bulunamadı'}), 400
         
-        cursor.execute('''
-            INSERT INTO sensor_data (node_id, light, temperature, humidity_air, humidity_ground, rx_drift, tx_drift, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            sensor_data['node_id'],
-            sensor_data['light'],
-            sensor_data['temperature'],
-            sensor_data['humidity_air'],
-            sensor_data['humidity_ground'],
-            sensor_data['rx_drift'],
-            sensor_data['tx_drift'],
-            timestamp
-        ))
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ Veri kaydedildi - Node: {sensor_data['node_id']}, "
-              f"Sıcaklık: {sensor_data['temperature']}°C, "
-              f"Hava Nemi: {sensor_data['humidity_air']}%, "
-              f"Toprak Nemi: {sensor_data['humidity_ground']}%, "
-              f"Işık: {sensor_data['light']} lux")
-        
-        return jsonify({'status': 'success', 'message': 'Veri başarıyla kaydedildi'}), 200
+        readings = json_data.get('readings')
+        if not isinstance(readings, list) or not readings:
+            logger.warning("Hata: readings listesi boş")
+            return jsonify({'error': 'readings listesi gereklidir'}), 400
+        
+        # Hatalı kayıtlar tüm partiyi engellemesin, ayrı raporlansın
+        rows = []
+        rejected = []
+        for index, item in enumerate(readings):
+            try:
+                rows.append(parse_reading(item))
+            except ValueError as e:
+                rejected.append({'index': index, 'error': str(e)})
+        
+        # Tüm geçerli kayıtları tek işlemde kaydet
+        sync = want_sync()
+        if rows:
+            write = get_writer().submit(DB_PATH, [(INSERT_SENSOR_SQL, rows)], wait=sync)
+            if sync:
+                write.wait()
+        
+        logger.debug("✅ Toplu veri kaydedildi - %d kayıt, %d reddedildi", len(rows), len(rejected))
         
+        return jsonify({
+            'status': 'success',
+            'inserted': len(rows),
+            'rejected': rejected,
+            'committed': sync
+        }), 200
+        
+    except (queue.Full, TimeoutError) as e:
+        return write_unavailable(e)
+    except Exception as e:
+        logger.error("❌ Toplu veri alma hatası: %s", e)
+        return jsonify({'error': f'Sunucu hatası: {str(e)}'}), 500
+
+# v2 şeması: alan -> kabul edilen tipler. bool, int'in alt sınıfı olduğu için
+# tip kontrolü isinstance ile değil type() ile yapılır.
+V2_SCHEMA = {
+    'node_id': (int,),
+    'light': (int, float),
+    'temperature': (int, float),
+    'humidity_air': (int, float),
+    'humidity_ground': (int, float),
+    'rx_drift': (int,),
+    'tx_drift': (int,),
+    'timestamp': (str,),
+    'coordinator': (str, type(None)),  # Kaydı ileten koordinatörün seri portu
+    'seq': (int, type(None)),  # Ağ geçidinin verdiği sıra numarası (tekilleştirme)
+    'sample_count': (int,),  # 1'den büyükse ağ geçidinde seyreltilmiş, bu kadar okumanın ortalaması
+}
+V2_COLUMNS = REQUIRED_FIELDS + ['timestamp', 'coordinator', 'seq', 'sample_count']
+
+# Gönderilmemesi kabul edilen alanlar -> varsayılan değer (eski ağ geçitleri için)
+V2_OPTIONAL_FIELDS = {
+    'coordinator': None,
+    'seq': None,
+    'sample_count': 1,
+}
+
+# Satırların başına gövdedeki gateway_id eklenir. Aynı (gateway_id, seq) ile
+# tekrar gelen kayıt benzersiz indekse takılır ve sessizce atlanır.
+INSERT_V2_SENSOR_SQL = f'''
+    INSERT OR IGNORE INTO sensor_data (gateway_id, {', '.join(V2_COLUMNS)})
+    VALUES ({', '.join('?' * (len(V2_COLUMNS) + 1))})
+'''
+
+SUMMARY_SCHEMA = {
+    'node_id': (int,),
+    'metric': (str,),
+    'window_start': (str,),
+    'window_end': (str,),
+    'count': (int,),
+    'min': (int, float),
+    'max': (int, float),
+    'mean': (int, float),
+    'last': (int, float),
+    'seq': (int, type(None)),
+}
+SUMMARY_COLUMNS = list(SUMMARY_SCHEMA)
+
+INSERT_SUMMARY_SQL = f'''
+    INSERT OR IGNORE INTO sensor_summaries (gateway_id, {', '.join(SUMMARY_COLUMNS)})
+    VALUES ({', '.join('?' * (len(SUMMARY_COLUMNS) + 1))})
+'''
+
+# Ağ geçidinde birleştirilmiş hata satırları (tip başına pencerede bir satır)
+ERROR_SCHEMA = {
+    'error_type': (str,),
+    'error_message': (str,),
+    'count': (int,),
+    'first_seen': (str,),
+    'last_seen': (str,),
+    'seq': (int, type(None)),  # Ağ geçidinin kayda verdiği sıra numarası (tekrar gönderimde aynı kalır)
+}
+ERROR_COLUMNS = list(ERROR_SCHEMA)  # store_errors sırası (gateway_id'den sonra)
+
+# Diğer koordinatör yazılımlarının kayıt türleri ("records" altında, tür başına alan + satır listesi)
+DRIFT_SCHEMA = {
+    'node_id': (int,),
+    'current_drift': (int,),
+    'estimated_drift': (int,),
+    'node_timestamp': (int,),
+    'valid': (bool,),
+    'timestamp': (str,),
+    'coordinator': (str, type(None)),
+    'seq': (int, type(None)),
+}
+
+ENVIRONMENT_SCHEMA = {
+    'node_id': (int, type(None)),  # Düğüm kimliğini yazmadan önce gelen ölçümlerde bilinmez
+    'metric': (str,),
+    'value': (int, float),
+    'timestamp': (str,),
+    'coordinator': (str, type(None)),
+    'seq': (int, type(None)),
+}
+
+ENERGEST_SCHEMA = {
+    'node_id': (int, type(None)),  # energest-udp/monitor/simple düğüm kimliği yazmaz
+    'total_cpu': (int,),
+    'total_lpm': (int,),
+    'total_deep_lpm': (int, type(None)),  # energest-simple.c yazmaz
+    'total_tx': (int,),
+    'total_rx': (int,),
+    'total_listen': (int, type(None)),  # energest-simple.c yazmaz
+    'timestamp': (str,),
+    'coordinator': (str, type(None)),
+    'seq': (int, type(None)),
+}
+
+# Kayıt türü -> tablo
+RECORD_TABLES = {
+    'drift': 'drift_data',
+    'environment': 'environment_data',
+    'energest': 'energest_data',
+}
+
+# v2 gövdesindeki satır türleri: tür -> (veritabanı sütun sırası, şema)
+V2_TABLES = {
+    'readings': (V2_COLUMNS, V2_SCHEMA),
+    'summaries': (SUMMARY_COLUMNS, SUMMARY_SCHEMA),
+    'errors': (ERROR_COLUMNS, ERROR_SCHEMA),
+    'drift': (list(DRIFT_SCHEMA), DRIFT_SCHEMA),
+    'environment': (list(ENVIRONMENT_SCHEMA), ENVIRONMENT_SCHEMA),
+    'energest': (list(ENERGEST_SCHEMA), ENERGEST_SCHEMA),
+}
+
+INSERT_RECORD_SQL = {
+    kind: f'''
+    INSERT OR IGNORE INTO {table} (gateway_id, {', '.join(V2_TABLES[kind][0])})
+    VALUES ({', '.join('?' * (len(V2_TABLES[kind][0]) + 1))})
+'''
+    for kind, table in RECORD_TABLES.items()
+}
+
+@functools.lru_cache(maxsize=32)
+def compile_v2_layout(kind, fields):
+    """
+    Gönderilen alan sırasını bir kez derle: her veritabanı sütunu için
+    (sütun adı, satırdaki konumu, kabul edilen tipler) listesi döndür.
+    Gönderilmeyen isteğe bağlı alanların konumu None'dır.
+    """
+    columns, schema = V2_TABLES[kind]
+    positions = {field: index for index, field in enumerate(fields)}
+    layout = []
+    for column in columns:
+        if column in positions:
+            layout.append((column, positions[column], schema[column]))
+        elif column in V2_OPTIONAL_FIELDS:
+            layout.append((column, None, None))
+        else:
+            raise ValueError(f'Eksik alan: {column}')
+    return tuple(layout)
+
+def decode_request_body():
+    """İstek gövdesini Content-Encoding'e göre (gzip / deflate) aç"""
+    encoding = request.headers.get('Content-Encoding', '').lower()
+    body = request.get_data()
+
+    if encoding in ('', 'identity'):
+        return body
+    if encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        decompressor = zlib.decompressobj()
+    else:
+        raise ValueError(f'Desteklenmeyen Content-Encoding: {encoding}')
+
+    try:
+        body = decompressor.decompress(body, MAX_DECOMPRESSED_BYTES)
+    except zlib.error:
+        raise ValueError('Sıkıştırılmış veri açılamadı')
+    if decompressor.unconsumed_tail:
+        raise ValueError('İstek gövdesi çok büyük')
+    return body
+
+def parse_v2_rows(kind, fields, rows, prefix=()):
+    """
+    v2 satırlarını tek geçişte doğrula, geçerli veritabanı satırlarını ve hataları döndür.
+    prefix her satırın başına eklenen sabit değerlerdir (ör. gateway_id).
+    """
+    if (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields) or
+            not isinstance(rows, list)):
+        raise ValueError('Alan ve satır listeleri gereklidir')
+
+    layout = compile_v2_layout(kind, tuple(fields))
+    width = len(fields)
+    valid = []
+    rejected = []
+
+    for index, row in enumerate(rows):
+        if not isinstance(row, list) or len(row) != width:
+            rejected.append({'index': index, 'error': 'Geçersiz satır formatı'})
+            continue
+
+        values = list(prefix)
+        for column, position, types in layout:
+            if position is None:
+                values.append(V2_OPTIONAL_FIELDS[column])
+                continue
+            value = row[position]
+            if type(value) not in types:
+                rejected.append({'index': index, 'error': f'Geçersiz alan: {column}'})
+                break
+            values.append(value)
+        else:
+            valid.append(tuple(values))
+
+    return valid, rejected
+
+@app.route('/v2/data', methods=['POST'])
+def receive_data_v2():
+    """
+    v2 formatında sensör verilerini al.
+    Gövde: {"v": 2, "fields": [...], "rows": [[...], ...]} - gzip / deflate sıkıştırılabilir.
+    İsteğe bağlı "summary_fields" / "summary_rows" ağ geçidinin pencere özetlerini,
+    "error_fields" / "error_rows" birleştirilmiş hata kayıtlarını taşır.
+    "records" diğer koordinatör yazılımlarının kayıtlarını tür başına taşır:
+    {"drift": {"fields": [...], "rows": [[...], ...]}, "environment": ..., "energest": ...}
+    "gateway_id" ve satırlardaki "seq" ile tekrar gönderilen kayıtlar bir kez kaydedilir.
+    Kayıtlar tek seferde parse edilir (iç içe JSON metni yok), tek işlemde kaydedilir.
+    """
+    try:
+        try:
+            payload = json.loads(decode_request_body())
+        except ValueError as e:
+            logger.warning("Hata: %s", e)
+            return jsonify({'error': str(e)}), 400
+
+        if not isinstance(payload, dict) or payload.get('v') != 2:
+            logger.warning("Hata: v2 formatı bekleniyor")
+            return jsonify({'error': 'v2 formatı bekleniyor'}), 400
+
+        gateway_id = payload.get('gateway_id')
+        if gateway_id is not None and type(gateway_id) is not str:
+            logger.warning("Hata: Geçersiz gateway_id")
+            return jsonify({'error': 'Geçersiz gateway_id'}), 400
+
+        try:
+            valid, rejected = parse_v2_rows(
+                'readings', payload.get('fields'), payload.get('rows'), (gateway_id,)
+            )
+            summaries, rejected_summaries = [], []
+            if 'summary_rows' in payload:
+                summaries, rejected_summaries = parse_v2_rows(
+                    'summaries', payload.get('summary_fields'), payload.get('summary_rows'), (gateway_id,)
+                )
+            errors, rejected_errors = [], []
+            if 'error_rows' in payload:
+                errors, rejected_errors = parse_v2_rows(
+                    'errors', payload.get('error_fields'), payload.get('error_rows'), (gateway_id,)
+                )
+            records = payload.get('records', {})
+            if not isinstance(records, dict):
+                raise ValueError('Geçersiz records alanı')
+            typed_records = {}
+            for kind, group in records.items():
+                if kind not in RECORD_TABLES:
+                    raise ValueError(f'Bilinmeyen kayıt türü: {kind}')
+                if not isinstance(group, dict):
+                    raise ValueError(f'Geçersiz kayıt grubu: {kind}')
+                typed_records[kind] = parse_v2_rows(kind, group.get('fields'), group.get('rows'), (gateway_id,))
+        except ValueError as e:
+            logger.warning("Hata: %s", e)
+            return jsonify({'error': str(e)}), 400
+
+        # Tüm geçerli kayıtları ve özetleri tek işlemde kaydet.
+        # Daha önce kaydedilmiş (tekrar gönderilen) satırlar eklenmez, tekrar olarak sayılır.
+        # Ağ geçidi 200 yanıtından sonra yerel kopyayı sildiği için her zaman commit beklenir;
+        # eşzamanlı istekler yine de yazıcıda aynı commit'i paylaşır.
+        operations = []
+        labels = []
+        if valid:
+            operations.append((INSERT_V2_SENSOR_SQL, valid))
+            labels.append('readings')
+        if summaries:
+            operations.append((INSERT_SUMMARY_SQL, summaries))
+            labels.append('summaries')
+        for kind, (rows, _) in typed_records.items():
+            if rows:
+                operations.append((INSERT_RECORD_SQL[kind], rows))
+                labels.append(kind)
+        writer = get_writer()
+        data_write = writer.submit(DB_PATH, operations, wait=True) if operations else None
+        error_write = writer.submit(ERROR_DB_PATH, [(store_errors, errors)], wait=True) if errors else None
+        counts = dict(zip(labels, data_write.wait())) if data_write else {}
+        if error_write:
+            error_write.wait()
+
+        inserted = counts.pop('readings', 0)
+        inserted_summaries = counts.pop('summaries', 0)
+        record_stats = counts
+        duplicates = len(valid) - inserted + len(summaries) - inserted_summaries
+        records_response = {}
+        for kind, (rows, rejected_rows) in typed_records.items():
+            record_inserted = record_stats.get(kind, 0)
+            duplicates += len(rows) - record_inserted
+            records_response[kind] = {
+                'inserted': record_inserted,
+                'duplicates': len(rows) - record_inserted,
+                'rejected': rejected_rows
+            }
+
+        logger.debug("✅ v2 veri kaydedildi - %d kayıt, %d özet, %d diğer, %d hata, %d tekrar, %d reddedildi",
+                     inserted, inserted_summaries, sum(record_stats.values()), len(errors), duplicates,
+                     len(rejected) + len(rejected_summaries) + len(rejected_errors) +
+                     sum(len(rejected_rows) for _, rejected_rows in typed_records.values()))
+
+        return jsonify({
+            'status': 'success',
+            'inserted': inserted,
+            'duplicates': len(valid) - inserted,
+            'rejected': rejected,
+            'summaries_inserted': inserted_summaries,
+            'summaries_duplicates': len(summaries) - inserted_summaries,
+            'summaries_rejected': rejected_summaries,
+            'errors_inserted': len(errors),
+            'errors_rejected': rejected_errors,
+            'records': records_response
+        }), 200
+
+    except (queue.Full, TimeoutError) as e:
+        return write_unavailable(e)
     except Exception as e:
-        print(f"❌ Veri alma hatası: {e}")
+        logger.error("❌ v2 veri alma hatası: %s", e)
         return jsonify({'error': f'Sunucu hatası: {str(e)}'}), 500
 
 @app.route('/error', methods=['POST'])
@@ -821,7 +2045,7 @@ def receive_error():
         json_data = request.get_json()
         
         if not json_data:
-            print("Hata: JSON veri bulunamadı")
+            logger.warning("Hata: JSON veri bulunamadı")
             return jsonify({'error': 'JSON veri bulunamadı'}), 400
         
         error_type = json_data.get('error_type', '')
@@ -829,81 +2053,155 @@ def receive_error():
         timestamp = json_data.get('timestamp', datetime.now().isoformat())
         
         if not error_type or not error_message:
-            print("Hata: error_type veya error_message boş")
+            logger.warning("Hata: error_type veya error_message boş")
             return jsonify({'error': 'error_type ve error_message gereklidir'}), 400
         
-        print(f"Gelen hata: {error_type} - {error_message}")
-        
-        # Hata veritabanına kaydet
-        conn = get_error_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO error_logs (error_type, error_message, timestamp)
-            VALUES (?, ?, ?)
-        ''', (error_type, error_message, timestamp))
+        logger.debug("Gelen hata: %s - %s", error_type, error_message)
         
-        conn.commit()
-        conn.close()
+        # Hata veritabanına kaydet (pencere içindeki aynı tip hatalarla birleştirilir)
+        sync = want_sync()
+        write = get_writer().submit(
+            ERROR_DB_PATH,
+            [(store_errors, [(None, error_type, error_message, 1, timestamp, timestamp, None)])],
+            wait=sync
+        )
+        if sync:
+            write.wait()
         
-        print(f"⚠️ Hata kaydedildi - Tip: {error_type}, Mesaj: {error_message}")
+        logger.info("⚠️ Hata kaydedildi - Tip: %s, Mesaj: %s", error_type, error_message)
         
-        return jsonify({'status': 'success', 'message': 'Hata başarıyla kaydedildi'}), 200
+        return jsonify({'status': 'success', 'message': 'Hata başarıyla kaydedildi', 'committed': sync}), 200
         
+    except (queue.Full, TimeoutError) as e:
+        return write_unavailable(e)
     except Exception as e:
-        print(f"❌ Hata alma hatası: {e}")
+        logger.error("❌ Hata alma hatası: %s", e)
         return jsonify({'error': f'Sunucu hatası: {str(e)}'}), 500
 
 @app.route('/api/clear', methods=['POST'])
 def clear_data():
     """Tüm sensör verilerini temizle"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM sensor_data')
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
-        
-        print(f"{deleted_count} sensör kaydı silindi")
+        get_writer().flush()  # Kuyruktaki kayıtlar temizlikten sonra yazılmasın
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM sensor_data')
+            deleted_count = cursor.rowcount
+            cursor.execute('DELETE FROM sensor_summaries')
+            for table in RECORD_TABLES.values():
+                cursor.execute(f'DELETE FROM {table}')
+            for table, _, _ in ROLLUP_RESOLUTIONS.values():
+                cursor.execute(f'DELETE FROM {table}')
+            rebuild_sensor_stats(cursor)
+            conn.commit()
+        
+        logger.info("%d sensör kaydı silindi", deleted_count)
         return jsonify({'status': 'success', 'deleted_count': deleted_count}), 200
         
     except Exception as e:
-        print(f"Veri temizleme hatası: {e}")
+        logger.error("Veri temizleme hatası: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/clear_errors', methods=['POST'])
 def clear_errors():
     """Tüm hata loglarını temizle"""
     try:
-        conn = get_error_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM error_logs')
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
-        
-        print(f"{deleted_count} hata kaydı silindi")
+        get_writer().flush()
+        with get_error_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM error_logs')
+            deleted_count = cursor.rowcount
+            cursor.execute('DELETE FROM error_deliveries')
+            rebuild_error_stats(cursor)
+            conn.commit()
+        
+        logger.info("%d hata kaydı silindi", deleted_count)
         return jsonify({'status': 'success', 'deleted_count': deleted_count}), 200
         
     except Exception as e:
-        print(f"Hata logları temizleme hatası: {e}")
+        logger.error("Hata logları temizleme hatası: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ingest')
+def api_ingest():
+    """Yazma kuyruğu durumu (derinlik, toplu commit sayıları)"""
+    writer = get_writer()
+    stats = dict(writer.stats)
+    stats['queue_depth'] = writer.queue.qsize()
+    stats['queue_capacity'] = WRITE_QUEUE_SIZE
+    stats['avg_batch_requests'] = round(stats['requests'] / stats['batches'], 2) if stats['batches'] else 0
+    return jsonify(stats)
+
 @app.route('/ping')
 def ping():
     """Bağlantı kontrolü için ping endpoint'i"""
     return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()}), 200
 
+# Sorgu planı kontrolleri: (veritabanı yolu ayarı, açıklama, sorgu, parametreler, kullanılması gereken indeks)
+# Tablo taraması veya geçici sıralama (USE TEMP B-TREE) içeren plan hatalı sayılır.
+QUERY_PLAN_CHECKS = (
+    ('DB_PATH', 'son kayıtlar', RECENT_DATA_SQL, (), 'idx_sensor_data_received_at'),
+    ('DB_PATH', 'düğüm zaman aralığı', SERIES_RAW_SQL.format(metric='temperature'),
+     (1, '', '', 1), 'idx_sensor_data_node_time'),
+    ('ERROR_DB_PATH', 'son hatalar', RECENT_ERRORS_SQL, (), 'idx_error_logs_received_at'),
+    ('ERROR_DB_PATH', 'hata tipi', 'SELECT * FROM error_logs WHERE error_type = ? ORDER BY received_at DESC LIMIT 50',
+     ('x',), 'idx_error_logs_type'),
+    ('ERROR_DB_PATH', 'hata birleştirme', FIND_ERROR_SQL, ('x', None), 'idx_error_logs_type'),
+    ('ERROR_DB_PATH', 'hata tekilleştirme', FIND_ERROR_DELIVERY_SQL, ('x', 1), 'PRIMARY KEY'),
+    ('DB_PATH', 'istatistikler', SENSOR_STATS_SQL, (), 'INTEGER PRIMARY KEY'),
+    ('ERROR_DB_PATH', 'hata istatistikleri', ERROR_STATS_SQL, (), 'INTEGER PRIMARY KEY'),
+) + tuple(
+    ('DB_PATH', f'zaman serisi ({resolution})', SERIES_ROLLUP_SQL.format(metric='temperature', table=table),
+     (1, '', ''), 'PRIMARY KEY')
+    for resolution, (table, _, _) in ROLLUP_RESOLUTIONS.items()
+)
+
+def check_query_plans():
+    """
+    Panel/API sorgularının indeks kullandığını EXPLAIN QUERY PLAN ile doğrula.
+    Sorunlu sorguların listesini döndürür (boşsa tüm planlar beklendiği gibi).
+    """
+    problems = []
+    for path_setting, name, sql, params, index in QUERY_PLAN_CHECKS:
+        with get_pool(globals()[path_setting]).connection() as conn:
+            plan = [row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        if not any(index in detail for detail in plan):
+            problems.append(f'{name}: {index} kullanılmıyor ({"; ".join(plan)})')
+        elif any(detail.startswith('SCAN') and 'INDEX' not in detail or 'TEMP B-TREE' in detail
+                 for detail in plan):
+            problems.append(f'{name}: tablo taraması veya sıralama ({"; ".join(plan)})')
+    return problems
+
 if __name__ == '__main__':
+    if '--check-plans' in sys.argv:
+        # Veritabanlarını hazırla, sorgu planlarını kontrol et ve çık (hata varsa çıkış kodu 1)
+        logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+        init_database()
+        init_error_database()
+        problems = check_query_plans()
+        for problem in problems:
+            logger.error("Sorgu planı: %s", problem)
+        if not problems:
+            logger.info("Tüm sorgu planları indeks kullanıyor (%d sorgu)", len(QUERY_PLAN_CHECKS))
+        sys.exit(1 if problems else 0)
+    
+    setup_logging()
+    if not ACCESS_LOG:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    
     # Veritabanlarını başlat
     init_database()
     init_error_database()
+    for problem in check_query_plans():
+        logger.warning("Sorgu planı: %s", problem)
     
-    print("Flask Sensör Sunucusu Başlatılıyor...")
-    print("Arayüz: http://localhost:5000")
-    print("HTTP modunda çalışıyor")
-    print("Hata logları için /error endpoint'i aktif")
+    logger.info("Flask Sensör Sunucusu Başlatılıyor...")
+    logger.info("Arayüz: http://localhost:5000")
+    logger.info("HTTP modunda çalışıyor")
+    logger.info("Hata logları için /error endpoint'i aktif")
+    logger.info("Toplu veri için /data/batch endpoint'i aktif")
+    logger.info("Sıkıştırılmış v2 veri formatı için /v2/data endpoint'i aktif")
+    logger.info("Zaman serisi için /api/series endpoint'i aktif")
     
     # HTTP için
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file